@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+from database import read_only
+from models import db, Artist, Venue, all_shows
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+# rows fetched per round trip from the server-side cursor
+YIELD_PER = 1000
+# bytes buffered before a chunk is sent
+CHUNK_SIZE = 64 * 1024
+
+
+# ----------------------------------------------------------------------------#
+# Queries.
+# ----------------------------------------------------------------------------#
+
+def venues_query():
+    query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+                             Venue.website, Venue.genres, Venue.seeking_talent, Venue.upcoming_show_count)
+    return filter_location(filter_genre(query, Venue), Venue).order_by(Venue.id)
+
+
+def artists_query():
+    query = db.session.query(Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+                             Artist.website, Artist.genres, Artist.looking_venues, Artist.upcoming_show_count)
+    return filter_location(filter_genre(query, Artist), Artist).order_by(Artist.id)
+
+
+def shows_query():
+    """
+    Shows with their venue and artist, archived ones included. city/state
+    filter on the venue and genre on the artist.
+    """
+    shows = all_shows()
+    query = db.session.query(shows.c.id, shows.c.start_time, shows.c.end_time, shows.c.venue_id,
+                             Venue.name.label('venue_name'), Venue.city, Venue.state, shows.c.artist_id,
+                             Artist.name.label('artist_name')) \
+        .join(Venue, shows.c.venue_id == Venue.id) \
+        .join(Artist, shows.c.artist_id == Artist.id)
+    start, end = date_argument('from'), date_argument('to')
+    if start is not None:
+        query = query.filter(shows.c.start_time >= start)
+    if end is not None:
+        query = query.filter(shows.c.start_time < end)
+    return filter_location(filter_genre(query, Artist), Venue).order_by(shows.c.start_time, shows.c.id)
+
+
+def filter_genre(query, model):
+    genres = request.args.getlist('genre')
+    return query.filter(model.genres.contains(genres)) if genres else query
+
+
+def filter_location(query, model):
+    for column in ('city', 'state'):
+        value = request.args.get(column)
+        if value:
+            query = query.filter(getattr(model, column) == value)
+    return query
+
+
+def date_argument(name):
+    """
+    The ISO datetime of the query argument name, or None. Show times are
+    naive local times: a value with an offset is converted to one.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        value = datetime.fromisoformat(value)
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+    except (ValueError, OverflowError):
+        abort(400)
+
+
+# ----------------------------------------------------------------------------#
+# Serialization.
+# ----------------------------------------------------------------------------#
+
+def plain(value, separator=None):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if separator is not None and isinstance(value, list):
+        return separator.join(value)
+    return value
+
+
+def ndjson_chunks(rows):
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps({key: plain(value) for key, value in row._mapping.items()}) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    yield ''.join(buffer)
+
+
+def csv_chunks(rows, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([plain(value, ';') for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export(query):
+    """
+    Stream the rows of query as NDJSON (default) or CSV (?format=csv) from a
+    server-side cursor, so memory does not depend on the table size.
+    """
+    output = request.args.get('format', 'ndjson')
+    if output not in ('ndjson', 'csv'):
+        abort(400)
+    header = [column['name'] for column in query.column_descriptions]
+    rows = query.execution_options(stream_results=True).yield_per(YIELD_PER)
+
+    if output == 'csv':
+        chunks, mimetype = csv_chunks(rows, header), 'text/csv'
+    else:
+        chunks, mimetype = ndjson_chunks(rows), 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+
+# ----------------------------------------------------------------------------#
+# Controllers.
+# ----------------------------------------------------------------------------#
+
+@api.route('/venues')
+@read_only
+def export_venues():
+    return export(venues_query())
+
+
+@api.route('/artists')
+@read_only
+def export_artists():
+    return export(artists_query())
+
+
+@api.route('/shows')
+@read_only
+def export_shows():
+    return export(shows_query())
@@ -3,29 +3,57 @@
 # ----------------------------------------------------------------------------#
 import datetime
 import json
-import sys
+import time
+from datetime import timedelta
+from functools import lru_cache
+from itertools import groupby
 
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
+import babel.dates
+import os
+
+from flask import Blueprint, Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, \
+    current_app, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
-from sqlalchemy import distinct
-
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from api import api, date_argument
+from assets import Assets
+from autocomplete import Autocomplete
+from cache import ResponseCache, conditional
+from compression import Compress
+from commands import register_commands
+from database import read_only
 from forms import *
-from models import Artist, Show, Venue, initialization
+from instrumentation import RequestMetrics
+from logs import StructuredLogging
+from matching import MatchEngine
+from profiling import RequestProfiler
+from models import db, ArchivedShow, Artist, Show, Venue, DEFAULT_SHOW_DURATION, EXCLUSION_VIOLATION, \
+    TableVersion, adjust_upcoming_show_count, all_shows, bump_versions, initialization, touch
 
 # ----------------------------------------------------------------------------#
 # App Config.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-db = initialization(app)
+# Extensions are bound to the application in create_app().
+moment = Moment()
+cache = ResponseCache()
+matcher = MatchEngine()
+suggestions = Autocomplete()
+main = Blueprint('main', __name__)
+
+# rows fetched per round trip by the streamed listings
+YIELD_PER = 1000
+# template events joined into one chunk of a streamed page
+STREAM_BUFFER = 256
+# shortest search term pg_trgm extracts a trigram from
+TRIGRAM_MIN_LENGTH = 3
 #app.config.from_object('config')
 #db = SQLAlchemy(app)
 #migrate = Migrate(app, db)
@@ -36,23 +64,282 @@ db = initialization(app)
 # Filters.
 # ----------------------------------------------------------------------------#
 
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    """
+    Compiled babel pattern and parsed locale, built once per format/locale.
+    Babel's named formats (short, medium, long, full) not overridden by
+    DATETIME_FORMATS resolve to the locale's date and time patterns.
+    """
+    locale = babel.Locale.parse(locale)
+    if format in DATETIME_FORMATS:
+        format = DATETIME_FORMATS[format]
+    elif format in ('short', 'medium', 'long', 'full'):
+        format = babel.dates.get_datetime_format(format, locale) \
+            .replace('{0}', babel.dates.get_time_format(format, locale).pattern) \
+            .replace('{1}', babel.dates.get_date_format(format, locale).pattern)
+    return babel.dates.parse_pattern(format), locale
+
+
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    # views pass datetime objects; strings are still accepted
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    pattern, locale = datetime_pattern(format, 'en')
+    return pattern.apply(value, locale)
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+
+# ----------------------------------------------------------------------------#
+# Queries.
+# ----------------------------------------------------------------------------#
+
+def search_queries(model, search_term):
+    """
+    The count and result queries of a search (see search_with_upcoming_counts).
+    Terms of TRIGRAM_MIN_LENGTH characters or more are served by the pg_trgm
+    GIN indexes and hits are ranked by trigram similarity. Shorter terms have
+    no trigram to look up: their hits are listed by name, read in order from
+    the name index until the page is full.
+    """
+    pattern = '%' + search_term + '%'
+    condition = or_(model.name.ilike(pattern), model.city.ilike(pattern))
+    if len(search_term) >= TRIGRAM_MIN_LENGTH:
+        rank = func.greatest(func.similarity(model.name, search_term), func.similarity(model.city, search_term))
+        order = (rank.desc(), model.name, model.id)
+    else:
+        order = (model.name, model.id)
+    matches = db.session.query(model.id).filter(condition) \
+        .limit(current_app.config['SEARCH_COUNT_LIMIT'] + 1) \
+        .subquery()
+    count = db.session.query(func.count()).select_from(matches)
+    results = db.session.query(model.id, model.name, model.upcoming_show_count.label('num_upcoming_shows')) \
+        .filter(condition) \
+        .order_by(*order) \
+        .limit(current_app.config['SEARCH_RESULTS_LIMIT'])
+    return count, results
+
+
+def search_with_upcoming_counts(model, search_term):
+    """
+    Case-insensitive partial search on the name or city of venues or artists.
+    At most SEARCH_RESULTS_LIMIT hits are returned, each with its precomputed
+    upcoming show count. Matches are counted up to SEARCH_COUNT_LIMIT only,
+    "capped" telling there are more.
+    """
+    count, results = search_queries(model, search_term)
+    count, results = count.scalar(), results.all()
+    count_limit = current_app.config['SEARCH_COUNT_LIMIT']
+    capped = count > count_limit
+    count = min(count, count_limit)
+    return {
+        "count": count,
+        "capped": capped,
+        "more": count - len(results),
+        "data": [{
+            "id": r.id,
+            "name": r.name,
+            "num_upcoming_shows": r.num_upcoming_shows
+        } for r in results]
+    }
+
+
+def selected_genres():
+    """
+    Genres of the ?genre= filters of a listing; an unknown genre is a 400.
+    """
+    genres = request.args.getlist('genre')
+    if any(genre not in GENRES for genre in genres):
+        abort(400)
+    return sorted(set(genres))
+
+
+def genre_facets(model, genres):
+    """
+    Number of venues or artists per genre among those having all of genres,
+    from one unnest aggregation. Each facet links to the listing with its
+    genre toggled. Genres outside forms.GENRES, e.g. legacy or imported ones,
+    get no facet: selected_genres() would reject their link.
+    """
+    genre = func.unnest(model.genres).label('genre')
+    query = db.session.query(genre)
+    if genres:
+        query = query.filter(model.genres.contains(genres))
+    unnested = query.subquery()
+    rows = db.session.query(unnested.c.genre, func.count()) \
+        .filter(unnested.c.genre.in_(GENRES)) \
+        .group_by(unnested.c.genre) \
+        .order_by(func.count().desc(), unnested.c.genre) \
+        .all()
+    return [{
+        "genre": name,
+        "count": count,
+        "selected": name in genres,
+        "url": url_for(request.endpoint, genre=sorted(set(genres) ^ {name}))
+    } for name, count in rows]
+
+
+def match_results(model, entity_id):
+    """
+    JSON top matches of a venue or an artist (see matching.MatchEngine), at
+    most ?limit= of them, with the genres each shares with the entity.
+    """
+    start = time.perf_counter()
+    limit = max(1, min(request.args.get('limit', current_app.config['MATCH_RESULTS'], type=int), 100))
+    ranked = matcher.matches(model, entity_id, limit)
+    if ranked is None:
+        abort(404)
+    target = Venue if model is Artist else Artist
+    genres = set(db.session.query(model.genres).filter(model.id == entity_id).scalar() or ())
+    details = {row.id: row for row in db.session.query(target.id, target.name, target.city, target.state,
+                                                       target.genres)
+               .filter(target.id.in_([candidate_id for candidate_id, _ in ranked]))}
+    # rows deleted through another worker are dropped here and from the index
+    matcher.discard(target, [candidate_id for candidate_id, _ in ranked if candidate_id not in details])
+    return jsonify({
+        "id": entity_id,
+        "matches": [{
+            "id": candidate_id,
+            "name": details[candidate_id].name,
+            "city": details[candidate_id].city,
+            "state": details[candidate_id].state,
+            "shared_genres": sorted(genres.intersection(details[candidate_id].genres or ())),
+            "score": round(score, 4)
+        } for candidate_id, score in ranked if candidate_id in details],
+        "took_ms": round((time.perf_counter() - start) * 1000, 3)
+    })
+
+
+def stream_page(template_name, **context):
+    """
+    Render a template as it is sent, STREAM_BUFFER template events per chunk.
+    Context values may be lazy iterables of rows: they are consumed while
+    rendering, inside the request context.
+    """
+    template = current_app.jinja_env.get_or_select_template(template_name)
+    current_app.update_template_context(context)
+    stream = template.stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
+def show_cursor(show):
+    """
+    Encode the keyset position of a show row as "<start_time iso>,<id>".
+    """
+    return '{},{}'.format(show.start_time.isoformat(), show.id)
+
+
+def parse_show_cursor(cursor):
+    """
+    Decode a cursor built by show_cursor into a (start_time, id) tuple.
+    """
+    if cursor is None:
+        return None
+    try:
+        start_time, show_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
+
+
+def load_with_shows(model, entity_id):
+    """
+    Load a venue or an artist together with its upcoming shows, read from the
+    show table alone, and one page of its past shows, newest first, read from
+    the show table and the archive. ?past= is the cursor of the last past show
+    of the previous page. A missing entity aborts with a 404.
+    """
+    entity = model.query.get_or_404(entity_id)
+    if model is Venue:
+        own, other, counterparty, prefix = 'venue_id', 'artist_id', Artist, 'artist'
+    else:
+        own, other, counterparty, prefix = 'artist_id', 'venue_id', Venue, 'venue'
+    columns = (counterparty.id.label('counterparty_id'), counterparty.name, counterparty.image_link)
+    now = datetime.now()
+    upcoming = db.session.query(Show.id, Show.start_time, *columns) \
+        .join(counterparty, getattr(Show, other) == counterparty.id) \
+        .filter(getattr(Show, own) == entity_id, Show.start_time > now) \
+        .order_by(Show.start_time) \
+        .all()
+
+    shows = all_shows()
+    per_page = current_app.config['PAST_SHOWS_PER_PAGE']
+    past_condition = and_(shows.c[own] == entity_id, shows.c.start_time <= now)
+    past_count = db.session.query(func.count()).select_from(shows).filter(past_condition).scalar()
+    query = db.session.query(shows.c.id, shows.c.start_time, *columns) \
+        .join(counterparty, shows.c[other] == counterparty.id) \
+        .filter(past_condition)
+    older_than = parse_show_cursor(request.args.get('past'))
+    if older_than is not None:
+        query = query.filter(tuple_(shows.c.start_time, shows.c.id) < tuple_(*older_than))
+    past = query.order_by(shows.c.start_time.desc(), shows.c.id.desc()).limit(per_page + 1).all()
+
+    data = {
+        **entity.__dict__,
+        "past_shows": [],
+        "upcoming_shows": [],
+        "past_shows_count": past_count,
+        "upcoming_shows_count": len(upcoming),
+        "past_shows_more": show_cursor(past[per_page - 1]) if len(past) > per_page else None,
+        "past_shows_paged": older_than is not None,
+    }
+    cache.tag('{}:{}'.format(model.__tablename__, entity_id))
+    for key, rows in (("upcoming_shows", upcoming), ("past_shows", past[:per_page])):
+        for s in rows:
+            cache.tag('{}:{}'.format(prefix, s.counterparty_id))
+            data[key].append({
+                prefix + "_id": s.counterparty_id,
+                prefix + "_name": s.name,
+                prefix + "_image_link": s.image_link,
+                "start_time": s.start_time
+            })
+    return data
+
+
+def record_version(model):
+    """
+    Version of a venue or artist page: one primary key lookup of updated_at and
+    of the upcoming show count, which changes when shows roll over to past.
+    Writes touch the rows whose pages list what they change, e.g. the venues
+    of an edited artist.
+    """
+    def version(**kwargs):
+        entity_id, = kwargs.values()
+        row = db.session.query(model.updated_at, model.upcoming_show_count).filter(model.id == entity_id).first()
+        if row is None:
+            abort(404)
+        return row.updated_at, row.upcoming_show_count
+    return version
+
+
+def listing_version(*models):
+    """
+    Version of a listing page: the table_version counters of every model it
+    displays, one primary key lookup each. Every write transaction bumps them
+    and they grow in commit order, which timestamps stamped before commit do
+    not. The page has no Last-Modified: only the ETag tells its versions apart.
+    """
+    names = sorted(model.__tablename__ for model in models)
+
+    def version(**kwargs):
+        versions = dict(db.session.query(TableVersion.name, TableVersion.version)
+                        .filter(TableVersion.name.in_(names)))
+        return None, tuple(versions.get(name, 0) for name in names)
+    return version
 
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -60,119 +347,110 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@read_only
+@conditional(listing_version(Venue))
+@cache.cached('venues')
 def venues():
     # Display venue data
     #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-    locations = db.session.query(distinct(Venue.city), Venue.state).order_by("state").all()
-
-    data = []
-    for location in locations:
-        dict = {
-            "city": location[0],
-            "state": location[1],
-            "venues": []
-        }
-        venues = Venue.query.filter_by(city=dict["city"], state=dict["state"]).all()
-        for v in venues:
-            upcomingShows = Show.query.filter_by(venue_id=v.id).filter(Show.start_time > datetime.now()).count()
-            dict["venues"].append({
-                "id": v.id,
-                "name": v.name,
-                "num_upcoming_shows": upcomingShows
-            })
-        data.append(dict)
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
+    # One query: every venue with its precomputed upcoming show count, ordered
+    # so that venues of the same area are adjacent and can be grouped in Python.
+    # The rows come from a server-side cursor and areas are grouped lazily while
+    # the page streams. ?genre= filters use the GIN index on genres.
+    genres = selected_genres()
+    rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                            Venue.upcoming_show_count.label('num_upcoming_shows'))
+    if genres:
+        rows = rows.filter(Venue.genres.contains(genres))
+    rows = rows.order_by(Venue.state, Venue.city, Venue.name) \
+        .execution_options(stream_results=True) \
+        .yield_per(YIELD_PER)
+
+    areas = ({
+        "city": city,
+        "state": state,
+        "venues": venues
+    } for (city, state), venues in groupby(rows, key=lambda v: (v.city, v.state)))
+    return stream_page('pages/venues.html', areas=areas, facets=genre_facets(Venue, genres), genres=genres)
+
+
+@main.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     # implement search on venues with partial string search.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    request_data = request.form["search_term"]
-    query = db.session.query(Venue).filter(Venue.name.ilike('%' + request_data + '%')).all()
-    response = {
-        "count": len(query),
-        "data": []
-    }
-    for q in query:
-        upcomingShows = Show.query.filter_by(venue_id=q.id).filter(Show.start_time > datetime.now()).count()
-        venueObject = {
-            "id": q.id,
-            "name": q.name,
-            "num_upcoming_shows": upcomingShows
-        }
-        response["data"].append(venueObject)
-    return render_template('pages/search_venues.html', results=response,
+    response = search_with_upcoming_counts(Venue, request.form["search_term"])
+    return stream_page('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@read_only
+@conditional(record_version(Venue))
+@cache.cached()
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    error = False
-    if db.session.query(Venue.id).first() is not None:
-        venue = Venue.query.get(venue_id)
-        data = {
-            **venue.__dict__,
-            "past_shows": [],
-            "upcoming_shows": [],
-            "past_shows_count": 0,
-            "upcoming_shows_count": 0,
-        }
-        upcoming_shows = db.session.query(Show) \
-            .join(Venue).filter(Show.venue_id == venue_id) \
-            .filter(Show.start_time > datetime.now()) \
-            .order_by(Show.start_time) \
-            .all()
-        past_shows = db.session.query(Show) \
-            .join(Venue).filter(Show.venue_id == venue_id) \
-            .filter(Show.start_time < datetime.now()) \
-            .order_by(Show.start_time) \
-            .all()
-        past_shows_count = Show.query.filter_by(venue_id=venue_id).filter(Show.start_time < datetime.now()).count()
-        upcoming_shows_count = Show.query.filter_by(venue_id=venue_id).filter(Show.start_time > datetime.now()).count()
-
-        for s in upcoming_shows:
-            listed = {
-                "artist_id": s.artist.id,
-                "artist_name": s.artist.name,
-                "artist_image_link": s.artist.image_link,
-                "start_time": str(s.start_time)
-            }
-            data["upcoming_shows"].append(listed)
-
-        for s in past_shows:
-            listed = {
-                "artist_id": s.artist.id,
-                "artist_name": s.artist.name,
-                "artist_image_link": s.artist.image_link,
-                "start_time": str(s.start_time)
-            }
-            data["past_shows"].append(listed)
-
-        data["past_shows_count"] = past_shows_count
-        data["upcoming_shows_count"] = upcoming_shows_count
-    else:
-        error = True
-
-    if error:
+    data = load_with_shows(Venue, venue_id)
+    return render_template('pages/show_venue.html', venue=data)
+
+
+@main.route('/venues/<int:venue_id>/matches')
+@read_only
+def venue_matches(venue_id):
+    # artists looking for venues, best fit first
+    return match_results(Venue, venue_id)
+
+
+@main.route('/venues/<int:venue_id>/availability')
+@read_only
+def venue_availability(venue_id):
+    # Free slots of the venue between ?from= and ?to= (ISO datetimes, default
+    # the next 7 days), at least ?duration= minutes long. The booked shows come
+    # from one range query on the GiST index of the double-booking constraint.
+    start = date_argument('from') or datetime.now().replace(second=0, microsecond=0)
+    end = date_argument('to') or start + timedelta(days=7)
+    minimum = timedelta(minutes=request.args.get('duration', 0, type=int))
+    if end <= start or end - start > timedelta(days=current_app.config['AVAILABILITY_MAX_DAYS']):
+        abort(400)
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
         abort(404)
-    else:
-        return render_template('pages/show_venue.html', venue=data)
+    booked = db.session.query(Show.id, Show.start_time, Show.end_time) \
+        .filter(Show.venue_id == venue_id,
+                func.tsrange(Show.start_time, Show.end_time).op('&&')(func.tsrange(start, end))) \
+        .order_by(Show.start_time) \
+        .all()
+
+    free = []
+    cursor = start
+    for slot_end, booked_until in [(show.start_time, show.end_time) for show in booked] + [(end, end)]:
+        if slot_end > cursor and slot_end - cursor >= minimum:
+            free.append({"start": cursor.isoformat(), "end": slot_end.isoformat()})
+        cursor = max(cursor, booked_until)
+    return jsonify({
+        "venue_id": venue_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "booked": [{
+            "show_id": show.id,
+            "start": show.start_time.isoformat(),
+            "end": show.end_time.isoformat()
+        } for show in booked],
+        "free": free
+    })
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # insert form data as a new Venue record in the db, instead
     # modify data to be the data object returned from db insertion
@@ -190,135 +468,102 @@ def create_venue_submission():
                       seeking_description=form.seeking_description.data, genres=form.genres.data)
 
         db.session.add(venue)
+        db.session.flush()
+        bump_versions(Venue)
         db.session.commit()
+        cache.invalidate('venues')
+        matcher.refresh(Venue)
+        suggestions.refresh(Venue)
         # on successful db insert, flash success
         flash('Venue ' + venue.name + ' was successfully listed!')
-    except:
+    except Exception:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        current_app.logger.exception('Venue %s could not be listed', form.name.data)
         flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
     finally:
         db.session.close()
         return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
     try:
+        # the venue's shows go with it, taking their artists' upcoming counts along
+        upcoming = db.session.query(Show.artist_id, func.count(Show.id)) \
+            .filter(Show.venue_id == venue_id, Show.start_time > datetime.now()) \
+            .group_by(Show.artist_id) \
+            .all()
+        for artist_id, count in upcoming:
+            db.session.query(Artist).filter(Artist.id == artist_id).update(
+                {Artist.upcoming_show_count: Artist.upcoming_show_count - count}, synchronize_session=False)
+        shows = all_shows()
+        touch(Artist, db.session.query(shows.c.artist_id).filter(shows.c.venue_id == venue_id).scalar_subquery())
+        Show.query.filter_by(venue_id=venue_id).delete()
+        ArchivedShow.query.filter_by(venue_id=venue_id).delete()
         Venue.query.filter_by(id=venue_id).delete()
+        bump_versions(Artist, deleted=(Venue, Show))
         db.session.commit()
-    except:
+        cache.invalidate('venues', 'shows', 'venue:{}'.format(venue_id))
+        matcher.discard(Venue, [int(venue_id)])
+        suggestions.discard(Venue, [int(venue_id)])
+    except Exception:
         db.session.rollback()
+        current_app.logger.exception('Venue %s could not be deleted', venue_id)
     finally:
         db.session.close()
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@read_only
+@conditional(listing_version(Artist))
+@cache.cached('artists')
 def artists():
-    # data of artists returned from querying the database
-    data = []
-    artists = Artist.query.all()
-    for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name,
-        })
+    # data of artists returned from querying the database, streamed from a
+    # server-side cursor
+    genres = selected_genres()
+    artists = db.session.query(Artist.id, Artist.name)
+    if genres:
+        artists = artists.filter(Artist.genres.contains(genres))
+    artists = artists.execution_options(stream_results=True).yield_per(YIELD_PER)
+    return stream_page('pages/artists.html', artists=artists, facets=genre_facets(Artist, genres), genres=genres)
 
-    return render_template('pages/artists.html', artists=data)
 
+@main.route('/artists/<int:artist_id>/matches')
+@read_only
+def artist_matches(artist_id):
+    # venues seeking talent, best fit first
+    return match_results(Artist, artist_id)
 
-@app.route('/artists/search', methods=['POST'])
+
+@main.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     # implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    request_data = request.form["search_term"]
-    query = db.session.query(Artist).filter(Artist.name.ilike('%' + request_data + '%')).all()
-    response = {
-        "count": len(query),
-        "data": []
-    }
-    for q in query:
-        upcomingShows = Show.query.filter_by(artist_id=q.id).filter(Show.start_time > datetime.now()).count()
-        artistObject = {
-            "id": q.id,
-            "name": q.name,
-            "num_upcoming_shows": upcomingShows
-        }
-        response["data"].append(artistObject)
-    return render_template('pages/search_artists.html', results=response,
+    response = search_with_upcoming_counts(Artist, request.form["search_term"])
+    return stream_page('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@read_only
+@conditional(record_version(Artist))
+@cache.cached()
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    # replace with real artist data from the artist table, using artist_id
-    error = False
-    if db.session.query(Artist.id).first() is not None:
-        artist = Artist.query.get(artist_id)
-        data = {
-            **artist.__dict__,
-            "past_shows": [],
-            "upcoming_shows": [],
-            "past_shows_count": 0,
-            "upcoming_shows_count": 0,
-        }
-        upcoming_shows = db.session.query(Show) \
-            .join(Venue).filter(Show.artist_id == artist_id) \
-            .filter(Show.start_time > datetime.now()) \
-            .order_by(Show.start_time) \
-            .all()
-        past_shows = db.session.query(Show) \
-            .join(Venue).filter(Show.artist_id == artist_id) \
-            .filter(Show.start_time < datetime.now()) \
-            .order_by(Show.start_time) \
-            .all()
-
-        past_shows_count = Show.query.filter_by(artist_id=artist_id).filter(
-            Show.start_time < datetime.now()
-        ).count()
-        upcoming_shows_count = Show.query.filter_by(artist_id=artist_id).filter(
-            Show.start_time > datetime.now()
-        ).count()
-
-        for s in upcoming_shows:
-            listed = {
-                "venue_id": s.venue.id,
-                "venue_name": s.venue.name,
-                "venue_image_link": s.venue.image_link,
-                "start_time": str(s.start_time)
-            }
-            data["upcoming_shows"].append(listed)
-
-        for s in past_shows:
-            listed = {
-                "venue_id": s.venue.id,
-                "venue_name": s.venue.name,
-                "venue_image_link": s.venue.image_link,
-                "start_time": str(s.start_time)
-            }
-            data["past_shows"].append(listed)
-
-        data["past_shows_count"] = past_shows_count
-        data["upcoming_shows_count"] = upcoming_shows_count
-    else:
-        error = True
-
-    if error:
-        abort(404)
-    else:
-        return render_template('pages/show_artist.html', artist=data)
+    data = load_with_shows(Artist, artist_id)
+    return render_template('pages/show_artist.html', artist=data)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     # populate form with fields from artist with ID <artist_id>
     artist = Artist.query.get(artist_id)
@@ -331,7 +576,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
@@ -349,19 +594,26 @@ def edit_artist_submission(artist_id):
             "seeking_description": form.seeking_description.data,
             "genres": form.genres.data
         })
+        # the pages of the venues listing the artist's shows show its name and image
+        shows = all_shows()
+        touch(Venue, db.session.query(shows.c.venue_id).filter(shows.c.artist_id == artist_id).scalar_subquery())
+        bump_versions(Artist)
         db.session.commit()
+        cache.invalidate('artists', 'shows', 'artist:{}'.format(artist_id))
+        matcher.refresh(Artist)
+        suggestions.refresh(Artist)
         # on successful db update, flash success
         flash('Artist ' + form.name.data + ' was successfully edited!')
-    except:
+    except Exception:
         db.session.rollback()
-        print(sys.exc_info())
+        current_app.logger.exception('Artist %s could not be edited', artist_id)
         flash('An error occurred. Artist ' + form.name.data + ' could not be edited.')
     finally:
         db.session.close()
-        return redirect(url_for('show_artist', artist_id=artist_id))
+        return redirect(url_for('.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     # populate form with values from venue with ID <venue_id>
     venue = Venue.query.get(venue_id)
@@ -373,12 +625,11 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
     form = VenueForm(request.form)
-    print(form.website_link.data)
     try:
         db.session.query(Venue).filter(Venue.id == venue_id).update({
             "name": form.name.data,
@@ -393,28 +644,35 @@ def edit_venue_submission(venue_id):
             "seeking_description": form.seeking_description.data,
             "genres": form.genres.data
         })
+        # the pages of the artists listing the venue's shows show its name and image
+        shows = all_shows()
+        touch(Artist, db.session.query(shows.c.artist_id).filter(shows.c.venue_id == venue_id).scalar_subquery())
+        bump_versions(Venue)
         db.session.commit()
+        cache.invalidate('venues', 'shows', 'venue:{}'.format(venue_id))
+        matcher.refresh(Venue)
+        suggestions.refresh(Venue)
         # on successful db update, flash success
         flash('Venue ' + form.name.data + ' was successfully edited!')
-    except:
+    except Exception:
         db.session.rollback()
-        print(sys.exc_info())
+        current_app.logger.exception('Venue %s could not be edited', venue_id)
         flash('An error occurred. Venue ' + form.name.data + ' could not be edited.')
     finally:
         db.session.close()
-        return redirect(url_for('show_venue', venue_id=venue_id))
+        return redirect(url_for('.show_venue', venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # insert form data as a new Venue record in the db, instead
@@ -427,13 +685,18 @@ def create_artist_submission():
                         website=form.website_link.data, looking_venues=form.seeking_venue.data,
                         seeking_description=form.seeking_description.data, genres=form.genres.data)
         db.session.add(artist)
+        db.session.flush()
+        bump_versions(Artist)
         db.session.commit()
+        cache.invalidate('artists')
+        matcher.refresh(Artist)
+        suggestions.refresh(Artist)
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
-    except:
+    except Exception:
         # on unsuccessful db insert, flash an error instead.
         db.session.rollback()
-        print(sys.exc_info())
+        current_app.logger.exception('Artist %s could not be listed', form.name.data)
         flash('An error occurred. Artist ' + form.name.data + ' could not be listed.')
     finally:
         db.session.close()
@@ -443,73 +706,180 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@read_only
+@conditional(listing_version(Show, Venue, Artist))
+@cache.cached('shows')
 def shows():
     # displays list of shows at /shows
-    # replace with real venues data.
-    data = []
-    shows = Show.query.order_by(Show.start_time).all()
-
-    for s in shows:
-        artist = Artist.query.get(s.artist_id)
-        venue = Venue.query.get(s.venue_id)
-        data.append({
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": str(s.start_time)
-        })
-    return render_template('pages/shows.html', shows=data)
+    # The feed is paginated by a keyset cursor on (start_time, id): ?after=
+    # returns the page following a show, ?before= the page preceding it.
+    per_page = current_app.config['SHOWS_PER_PAGE']
+    after = parse_show_cursor(request.args.get('after'))
+    before = parse_show_cursor(request.args.get('before'))
+    shows = all_shows()
+    position = tuple_(shows.c.start_time, shows.c.id)
+    query = db.session.query(shows.c.id, shows.c.start_time, shows.c.venue_id, Venue.name.label('venue_name'),
+                             shows.c.artist_id, Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link')) \
+        .join(Venue, shows.c.venue_id == Venue.id) \
+        .join(Artist, shows.c.artist_id == Artist.id)
+
+    if before is not None:
+        rows = query.filter(position < tuple_(*before)) \
+            .order_by(shows.c.start_time.desc(), shows.c.id.desc()) \
+            .limit(per_page + 1) \
+            .all()
+        has_previous, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if after is not None:
+            query = query.filter(position > tuple_(*after))
+        rows = query.order_by(shows.c.start_time, shows.c.id).limit(per_page + 1).all()
+        has_previous, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    pagination = {
+        "previous": show_cursor(rows[0]) if rows and has_previous else None,
+        "next": show_cursor(rows[-1]) if rows and has_next else None,
+    }
+    return stream_page('pages/shows.html', shows=rows, pagination=pagination)
 
 
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # insert form data as a new Show record in the db, instead
     form = ShowForm(request.form)
+    if not form.validate():
+        # e.g. a duration outside 15 minutes to a day, or a malformed start time
+        errors = ['{}: {}'.format(name.replace('_', ' '), '; '.join(messages))
+                  for name, messages in form.errors.items()]
+        flash('Show could not be listed. ' + ' '.join(errors))
+        return render_template('forms/new_show.html', form=form), 400
     try:
-        show = Show(venue_id=form.venue_id.data, artist_id=form.artist_id.data, start_time=form.start_time.data)
+        duration = timedelta(minutes=form.duration.data) if form.duration.data else DEFAULT_SHOW_DURATION
+        show = Show(venue_id=form.venue_id.data, artist_id=form.artist_id.data, start_time=form.start_time.data,
+                    end_time=form.start_time.data + duration)
         db.session.add(show)
+        adjust_upcoming_show_count(show.venue_id, show.artist_id, show.start_time, 1)
+        touch(Venue, [show.venue_id])
+        touch(Artist, [show.artist_id])
+        bump_versions(Show, Venue, Artist)
         db.session.commit()
+        cache.invalidate('venues', 'shows', 'venue:{}'.format(show.venue_id), 'artist:{}'.format(show.artist_id))
         # on successful db insert, flash success
         flash('Show was successfully listed!')
-    except:
+    except IntegrityError as error:
         db.session.rollback()
-        print(sys.exc_info())
+        if getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION:
+            # the exclusion constraint rejected an overlapping booking
+            flash('Venue {} is already booked at that time. Show could not be listed.'.format(form.venue_id.data))
+        else:
+            current_app.logger.exception('Show of artist %s at venue %s could not be listed',
+                                         form.artist_id.data, form.venue_id.data)
+            flash('An error occurred. Show could not be listed.')
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Show of artist %s at venue %s could not be listed',
+                                     form.artist_id.data, form.venue_id.data)
         # on unsuccessful db insert, flash an error instead.
         flash('An error occurred. Show could not be listed.')
     finally:
         return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@main.route('/autocomplete')
+@read_only
+def autocomplete():
+    # Name and city suggestions for the prefix ?q= from the in-memory index
+    # (see autocomplete.Autocomplete), for ?type=venues and/or artists.
+    start = time.perf_counter()
+    models = {'venues': Venue, 'artists': Artist}
+    types = request.args.getlist('type') or list(models)
+    if not set(types) <= set(models):
+        abort(400)
+    limit = max(1, min(request.args.get('limit', current_app.config['AUTOCOMPLETE_RESULTS'], type=int), 20))
+    term = request.args.get('q', '')[:100]
+    results = {name: suggestions.suggest(models[name], term, limit) for name in types}
+    return jsonify({
+        "q": term,
+        **results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 3)
+    })
+
+
+@main.route('/metrics/cache')
+def cache_metrics():
+    return jsonify(cache.stats())
+
+
+@main.route('/metrics/pool')
+def pool_metrics():
+    return jsonify(db.pool_stats(current_app))
+
+
+@main.route('/metrics/logs')
+def log_metrics():
+    logs = current_app.extensions.get('structured_logging')
+    return jsonify(logs.stats() if logs else {})
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# ----------------------------------------------------------------------------#
+# Application factory.
+# ----------------------------------------------------------------------------#
+
+def create_app(config='config'):
+    """
+    Build the application. Safe to call in a preloading master process: no
+    connection is opened here and every worker drops the inherited pool and
+    background writer after fork.
+    """
+    app = Flask(__name__)
+    initialization(app, config)
+    if not app.config.get('SECRET_KEY'):
+        if not app.debug:
+            raise RuntimeError('SECRET_KEY must be set so that every worker signs sessions and CSRF tokens alike')
+        app.config['SECRET_KEY'] = os.urandom(32)
+    moment.init_app(app)
+    Assets(app)
+    Compress(app)
+    matcher.init_app(app)
+    suggestions.init_app(app)
+    cache.init_app(app)
+    RequestMetrics(app)
+    RequestProfiler(app)
+    register_commands(app)
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+
+    if not app.debug:
+        StructuredLogging(app)
+
+    os.register_at_fork(after_in_child=lambda: db.dispose_engines(app))
+    return app
+
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -517,11 +887,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import click
+from flask import Blueprint, Response, abort, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+assets = Blueprint('assets', __name__, url_prefix='/assets')
+
+# bundle -> files of the static folder concatenated into it, in order
+BUNDLES = {
+    'css/app.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css', 'css/main.responsive.css',
+                    'css/main.quickfix.css'],
+    'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'js/app.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+# files referenced on their own
+SINGLES = ['js/libs/jquery-1.11.1.min.js', 'js/libs/respond-1.4.2.min.js', 'img/front-splash.jpg']
+COMPRESSIBLE = ('.css', '.js', '.svg')
+# (Content-Encoding, suffix) in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ONE_YEAR = 365 * 24 * 3600
+
+
+# ----------------------------------------------------------------------------#
+# Extension.
+# ----------------------------------------------------------------------------#
+
+class Assets:
+    """
+    Serves the bundles and files written by `flask build-assets` under
+    fingerprinted names, precompressed and cached for a year. Templates link
+    them with static_url(); before a build it falls back to the unminified
+    sources.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = os.path.join(app.static_folder, app.config.get('ASSETS_DIR', 'dist'))
+        try:
+            with open(os.path.join(self.folder, 'manifest.json')) as file:
+                self.manifest = json.load(file)
+        except FileNotFoundError:
+            self.manifest = {}
+        app.jinja_env.globals['static_url'] = static_url
+        app.register_blueprint(assets)
+        app.extensions['assets'] = self
+
+
+def static_url(name):
+    manifest = current_app.extensions['assets'].manifest
+    if name in manifest:
+        return url_for('assets.serve', filename=manifest[name])
+    if name in BUNDLES:
+        return url_for('assets.serve', filename=name)
+    return url_for('static', filename=name)
+
+
+def bundle_source(name, minified=False):
+    separator = '\n' if name.endswith('.css') else '\n;\n'
+    contents = []
+    for path in BUNDLES[name]:
+        with open(os.path.join(current_app.static_folder, path), encoding='utf-8') as file:
+            source = file.read()
+        contents.append(minify(name, source, path) if minified else source)
+    return separator.join(contents)
+
+
+@assets.route('/<path:filename>')
+def serve(filename):
+    state = current_app.extensions['assets']
+    if filename in BUNDLES and filename not in state.manifest:
+        # not built yet: the plain concatenation, never cached
+        response = Response(bundle_source(filename), mimetype=mimetypes.guess_type(filename)[0])
+        response.cache_control.no_cache = True
+        return response
+
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(state.folder, filename + suffix)):
+            response = send_from_directory(state.folder, filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        if not os.path.isfile(os.path.join(state.folder, filename)):
+            abort(404)
+        response = send_from_directory(state.folder, filename)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = ONE_YEAR
+    response.cache_control.immutable = True
+    return response
+
+
+# ----------------------------------------------------------------------------#
+# Build.
+# ----------------------------------------------------------------------------#
+
+def minify(name, source, path):
+    import rcssmin
+    import rjsmin
+
+    if '.min.' in path:
+        return source
+    if name.endswith('.css'):
+        return rcssmin.cssmin(source)
+    return rjsmin.jsmin(source)
+
+
+def fingerprinted(name, content):
+    root, extension = os.path.splitext(name)
+    return '{}.{}{}'.format(root, hashlib.sha256(content).hexdigest()[:12], extension)
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove files left by previous builds.')
+@with_appcontext
+def build_assets(clean):
+    """
+    Bundle and minify the CSS and JS, write every asset under a name
+    carrying its content hash with gzip and brotli variants, and record the
+    names in the manifest read by static_url().
+    """
+    import brotli
+
+    state = current_app.extensions['assets']
+    outputs = {}
+    for name in BUNDLES:
+        outputs[name] = bundle_source(name, minified=True).encode('utf-8')
+    for name in SINGLES:
+        with open(os.path.join(current_app.static_folder, name), 'rb') as file:
+            outputs[name] = file.read()
+
+    manifest = {}
+    written = {'manifest.json'}
+    for name, content in outputs.items():
+        target = fingerprinted(name, content)
+        manifest[name] = target
+        path = os.path.join(state.folder, target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        variants = {target: content}
+        if name.endswith(COMPRESSIBLE):
+            variants[target + '.gz'] = gzip.compress(content, 9, mtime=0)
+            variants[target + '.br'] = brotli.compress(content, quality=11)
+        for variant, data in variants.items():
+            if variant != target and len(data) >= len(content):
+                continue
+            with open(os.path.join(state.folder, variant), 'wb') as file:
+                file.write(data)
+            written.add(variant)
+        click.echo('{:<44} {:>8} {:>8} {:>8}'.format(target, *(len(variants[variant]) if variant in written else '-'
+                                                           for variant in (target, target + '.gz', target + '.br'))))
+
+    with open(os.path.join(state.folder, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    state.manifest = manifest
+
+    if clean:
+        for directory, _, files in os.walk(state.folder):
+            for file in files:
+                path = os.path.join(directory, file)
+                if os.path.relpath(path, state.folder) not in written:
+                    os.remove(path)
@@ -0,0 +1,342 @@
+import heapq
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+
+from matching import REFRESH_OVERLAP
+from models import db, Artist, TableVersion, Venue
+
+# sorts after every character a normalized key can hold
+KEY_END = '\U0010ffff'
+# prefixes whose top suggestions are computed when the index is loaded
+WARM_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    """
+    Lowercase text without accents or punctuation, its words separated by
+    single spaces: 'Café  Du-Monde' -> 'cafe du monde'.
+    """
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+def word_keys(text):
+    """
+    The keys a text is found under: itself and every suffix starting at a
+    word, so 'the musical hop' is suggested for 'mus' and 'hop' too.
+    """
+    words = normalize(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+# ----------------------------------------------------------------------------#
+# Index.
+# ----------------------------------------------------------------------------#
+
+class PrefixIndex:
+    """
+    Sorted array of (key, item id) pairs; the items under a prefix are the
+    contiguous run found by bisection. Items matching from their first word
+    rank first, then by weight. The top items of the prefixes asked for are
+    kept in an LRU cache; a change drops only the entries it can alter, so
+    the costly short prefixes stay cached.
+    """
+
+    def __init__(self, cache_size=4096):
+        self.keys = []
+        self.items = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def load(self, items):
+        """
+        Replace the whole index by items, an iterable of (id, data, weight,
+        text) with data returned as is in the suggestions.
+        """
+        self.items = {}
+        keys = []
+        for item_id, data, weight, text in items:
+            item_keys = word_keys(text)
+            self.items[item_id] = (data, weight, item_keys)
+            keys.extend((key, item_id) for key in item_keys)
+        keys.sort()
+        self.keys = keys
+        self.cache.clear()
+
+    def add(self, item_id, data, weight, text):
+        old_keys = self._remove(item_id)
+        item_keys = word_keys(text)
+        self.items[item_id] = (data, weight, item_keys)
+        for key in item_keys:
+            insort(self.keys, (key, item_id))
+        self.invalidate(item_id, old_keys + item_keys)
+
+    def remove(self, item_id):
+        self.invalidate(item_id, self._remove(item_id))
+
+    def _remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return []
+        for key in item[2]:
+            position = bisect_left(self.keys, (key, item_id))
+            if position < len(self.keys) and self.keys[position] == (key, item_id):
+                del self.keys[position]
+        return item[2]
+
+    def invalidate(self, item_id, keys):
+        """
+        Drop the cached prefixes of keys whose top the item was in, or now
+        enters.
+        """
+        for prefix in {key[:n] for key in keys for n in range(1, len(key) + 1)}:
+            cached = self.cache.get(prefix)
+            if cached is None:
+                continue
+            limit, best = cached
+            rank = self.rank(item_id, prefix)
+            if any(other_id == item_id for _, other_id in best) or \
+                    (rank is not None and (len(best) < limit or rank > best[-1][0])):
+                del self.cache[prefix]
+
+    def rank(self, item_id, prefix):
+        if item_id not in self.items:
+            return None
+        _, weight, item_keys = self.items[item_id]
+        ranks = [(key == item_keys[0], weight) for key in item_keys if key.startswith(prefix)]
+        return max(ranks) if ranks else None
+
+    def top(self, prefix, limit):
+        cached = self.cache.get(prefix)
+        if cached is not None and cached[0] >= limit:
+            self.cache.move_to_end(prefix)
+            return [self.items[item_id][0] for _, item_id in cached[1][:limit]]
+        start = bisect_left(self.keys, (prefix,))
+        end = bisect_left(self.keys, (prefix + KEY_END,), start)
+        ranks = {}
+        for key, item_id in self.keys[start:end]:
+            _, weight, item_keys = self.items[item_id]
+            rank = (key == item_keys[0], weight)
+            if rank > ranks.get(item_id, (False, float('-inf'))):
+                ranks[item_id] = rank
+        best = heapq.nlargest(limit, ((rank, item_id) for item_id, rank in ranks.items()), key=lambda pair: pair[0])
+        self.cache[prefix] = (limit, best)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return [self.items[item_id][0] for _, item_id in best]
+
+    def warm(self, length, limit):
+        for prefix in sorted({key[:n] for key, _ in self.keys for n in range(1, length + 1)}):
+            self.top(prefix, limit)
+
+
+class EntitySuggestions:
+    """
+    Names and cities of every venue or artist. Names weigh their upcoming
+    show count, cities the number of rows in them. Rows updated since the
+    last refresh are read again through the updated_at index. Deletions by
+    other workers are noticed from the deletion count of table_version,
+    after which the ids still in the table are read.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.names = PrefixIndex()
+        self.cities = PrefixIndex()
+        self.city_counts = {}
+        self.locations = {}
+        self.watermark = None
+        self.deletions = 0
+
+    def query(self):
+        model = self.model
+        return db.session.query(model.id, model.name, model.city, model.state, model.upcoming_show_count,
+                                model.updated_at)
+
+    def deletion_count(self):
+        return db.session.query(TableVersion.deletions) \
+            .filter(TableVersion.name == self.model.__tablename__) \
+            .scalar() or 0
+
+    def load(self):
+        # read first: a deletion committed during the load shows at the next refresh
+        self.deletions = self.deletion_count()
+        rows = self.query().all()
+        self.names.load((row.id, self.name_data(row), row.upcoming_show_count, row.name) for row in rows)
+        self.locations = {row.id: self.location(row) for row in rows}
+        self.city_counts = {}
+        for location in self.locations.values():
+            self.city_counts[location] = self.city_counts.get(location, 0) + 1
+        self.cities.load((location, self.city_data(location, count), count, location[0])
+                         for location, count in self.city_counts.items())
+        self.watermark = max((row.updated_at for row in rows), default=None)
+
+    def changes(self):
+        """
+        The rows written since the last refresh, the deletion count and, when
+        it moved, the ids still in the table; passed to apply.
+        """
+        model = self.model
+        query = self.query()
+        if self.watermark is not None:
+            query = query.filter(model.updated_at >= self.watermark - REFRESH_OVERLAP)
+        rows = query.all()
+        deletions = self.deletion_count()
+        existing = None
+        if deletions != self.deletions:
+            existing = {entity_id for entity_id, in db.session.query(model.id)}
+        return rows, deletions, existing
+
+    def apply(self, rows, deletions, existing):
+        for row in rows:
+            self.names.add(row.id, self.name_data(row), row.upcoming_show_count, row.name)
+            self.move(row.id, self.location(row))
+        if rows:
+            self.watermark = max(self.watermark or datetime.min, max(row.updated_at for row in rows))
+        if existing is not None:
+            self.discard([entity_id for entity_id in self.locations if entity_id not in existing])
+        self.deletions = deletions
+
+    def discard(self, ids):
+        for entity_id in ids:
+            self.names.remove(entity_id)
+            self.move(entity_id, None)
+
+    def move(self, entity_id, location):
+        previous = self.locations.pop(entity_id, None)
+        if location is not None:
+            self.locations[entity_id] = location
+        if previous == location:
+            return
+        for city, delta in ((previous, -1), (location, 1)):
+            if city is None:
+                continue
+            count = self.city_counts.get(city, 0) + delta
+            if count > 0:
+                self.city_counts[city] = count
+                self.cities.add(city, self.city_data(city, count), count, city[0])
+            else:
+                self.city_counts.pop(city, None)
+                self.cities.remove(city)
+
+    @staticmethod
+    def location(row):
+        return (row.city or '').strip(), (row.state or '').strip()
+
+    @staticmethod
+    def name_data(row):
+        return {"id": row.id, "name": row.name, "city": row.city, "state": row.state,
+                "num_upcoming_shows": row.upcoming_show_count}
+
+    @staticmethod
+    def city_data(location, count):
+        return {"city": location[0], "state": location[1], "count": count}
+
+
+# ----------------------------------------------------------------------------#
+# Extension.
+# ----------------------------------------------------------------------------#
+
+class Autocomplete:
+    """
+    In-memory name and city suggestions for the search boxes, answered
+    without a query. Every worker loads the index once, at start under
+    gunicorn (see gunicorn.conf.py) or on its first suggestion otherwise.
+    A background thread then applies the writes of the other workers every
+    AUTOCOMPLETE_REFRESH seconds; the write handlers apply their own at once.
+    """
+
+    def __init__(self, app=None):
+        self.entities = {}
+        # _lock guards the index, held by suggestions and while changes are
+        # applied; _refresh_lock runs one refresh at a time, queries included
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.limit = app.config.get('AUTOCOMPLETE_RESULTS', 8)
+        self.interval = app.config.get('AUTOCOMPLETE_REFRESH', 5)
+        # the refresh thread does not survive fork: a worker inheriting a loaded index restarts it
+        os.register_at_fork(after_in_child=self._after_fork)
+        app.extensions['autocomplete'] = self
+
+    def load(self):
+        with self._refresh_lock, self._lock:
+            for model in (Venue, Artist):
+                entities = EntitySuggestions(model)
+                entities.load()
+                entities.names.warm(WARM_PREFIX_LENGTH, self.limit)
+                entities.cities.warm(WARM_PREFIX_LENGTH, self.limit)
+                self.entities[model] = entities
+        self._start()
+
+    def refresh(self, *models):
+        """
+        Apply the rows written since the last refresh; called by the write
+        handlers and the refresh thread. Nothing happens before the index is
+        loaded. Suggestions wait only while the changes are applied, not
+        while they are read.
+        """
+        with self._refresh_lock:
+            for model in models:
+                entities = self.entities.get(model)
+                if entities is None:
+                    continue
+                changes = entities.changes()
+                with self._lock:
+                    entities.apply(*changes)
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='autocomplete-refresh', daemon=True)
+            self._thread.start()
+
+    def _after_fork(self):
+        # a lock held by a thread of the parent would never be released here
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        if self.entities:
+            self._start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    self.refresh(Venue, Artist)
+            except Exception:
+                self.app.logger.exception('Search suggestions could not be refreshed')
+
+    def discard(self, model, ids):
+        with self._lock:
+            if model in self.entities:
+                self.entities[model].discard(ids)
+
+    def suggest(self, model, term, limit=None):
+        """
+        The limit best {'names': [...], 'cities': [...]} of model for the
+        prefix term.
+        """
+        if not self.entities:
+            self.load()
+        prefix = normalize(term)
+        limit = limit or self.limit
+        with self._lock:
+            entities = self.entities[model]
+            if not prefix:
+                return {"names": [], "cities": []}
+            return {"names": entities.names.top(prefix, limit), "cities": entities.cities.top(prefix, limit)}
@@ -0,0 +1,165 @@
+import json
+import os
+import random
+import statistics
+import time
+import urllib.request
+from urllib.parse import urlencode
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func
+
+from cache import NullBackend
+from models import db, Artist, Venue
+
+SEARCH_TERMS = ['music', 'band', 'san', 'blue', 'hall', 'york', 'electric', 'club']
+
+
+def sample_ids(model, count, rng):
+    low, high = db.session.query(func.min(model.id), func.max(model.id)).one()
+    if low is None:
+        return [1]
+    return [rng.randint(low, high) for _ in range(count)]
+
+
+def endpoints(rng, count):
+    """
+    (name, method, path, form) builders for every read endpoint; each call
+    picks another record or search term so runs do not hit a single row.
+    """
+    venue_ids = sample_ids(Venue, count, rng)
+    artist_ids = sample_ids(Artist, count, rng)
+    db.session.close()
+    return [
+        ('venues', lambda: ('GET', '/venues', None)),
+        ('search_venues', lambda: ('POST', '/venues/search', {'search_term': rng.choice(SEARCH_TERMS)})),
+        ('show_venue', lambda: ('GET', '/venues/{}'.format(rng.choice(venue_ids)), None)),
+        ('artists', lambda: ('GET', '/artists', None)),
+        ('search_artists', lambda: ('POST', '/artists/search', {'search_term': rng.choice(SEARCH_TERMS)})),
+        ('show_artist', lambda: ('GET', '/artists/{}'.format(rng.choice(artist_ids)), None)),
+        ('shows', lambda: ('GET', '/shows', None)),
+    ]
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_endpoint(send, build, requests):
+    timings, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        method, path, form = build()
+        start = time.perf_counter()
+        status, statements = send(method, path, form)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(statements)
+        errors += status >= 400
+    elapsed = time.perf_counter() - started
+    return {
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'queries': statistics.mean(queries) if None not in queries else None,
+        'errors': errors,
+    }
+
+
+def test_client_sender():
+    """
+    Send requests through the Flask test client, counting SQL statements.
+    """
+    client = current_app.test_client()
+    # read-only routes run on the replica when there is one
+    engines = list(db.engines(current_app).values())
+    counter = [0]
+
+    def count(*args):
+        counter[0] += 1
+
+    def send(method, path, form):
+        counter[0] = 0
+        for engine in engines:
+            event.listen(engine, 'after_cursor_execute', count)
+        try:
+            # buffered: streamed pages render while their body is read
+            response = client.open(path, method=method, data=form, buffered=True)
+        finally:
+            for engine in engines:
+                event.remove(engine, 'after_cursor_execute', count)
+        return response.status_code, counter[0]
+    return send
+
+
+def http_sender(base_url):
+    """
+    Send requests to a running server; SQL statements cannot be counted.
+    """
+    def send(method, path, form):
+        data = urlencode(form).encode() if form else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(base_url + path, data=data, method=method)) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+    return send
+
+
+@click.command('benchmark')
+@click.option('--requests', default=100, show_default=True, help='Requests per endpoint.')
+@click.option('--url', help='Base URL of a running server; defaults to the in-process test client.')
+@click.option('--cache/--no-cache', default=False, show_default=True,
+              help='Keep the response cache enabled (test client only).')
+@click.option('--baseline', default='benchmark_baseline.json', show_default=True,
+              help='Saved results to compare against.')
+@click.option('--save', is_flag=True, help='Write the results as the new baseline.')
+@click.option('--tolerance', default=0.2, show_default=True,
+              help='Allowed p95 regression against the baseline before failing.')
+@click.option('--random-seed', default=42, show_default=True)
+@with_appcontext
+def benchmark_command(requests, url, cache, baseline, save, tolerance, random_seed):
+    """
+    Drive every read endpoint and report p50/p95/p99 latency, throughput and
+    SQL statements per request, compared with a saved baseline.
+    """
+    rng = random.Random(random_seed)
+    if url:
+        send = http_sender(url.rstrip('/'))
+    else:
+        send = test_client_sender()
+        if not cache:
+            current_app.extensions['response_cache'].backend = NullBackend()
+
+    previous = {}
+    if os.path.exists(baseline):
+        with open(baseline) as file:
+            previous = json.load(file)
+
+    results, regressions = {}, []
+    click.echo('{:<15} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8}'.format(
+        'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'queries', 'vs base'))
+    for name, build in endpoints(rng, requests):
+        send(*build())  # warm up
+        result = results[name] = run_endpoint(send, build, requests)
+        change = ''
+        if name in previous:
+            ratio = result['p95_ms'] / previous[name]['p95_ms'] - 1
+            change = '{:+.0%}'.format(ratio)
+            if ratio > tolerance:
+                regressions.append(name)
+        click.echo('{:<15} {p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f} {throughput_rps:>9.1f} {:>8} {:>8}'.format(
+            name, '-' if result['queries'] is None else '{:.1f}'.format(result['queries']), change, **result))
+        if result['errors']:
+            click.echo('  {} request(s) failed'.format(result['errors']))
+
+    if save:
+        with open(baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        click.echo('baseline saved to {}'.format(baseline))
+    if regressions:
+        raise click.ClickException('p95 regressed by more than {:.0%} on: {}'.format(tolerance, ', '.join(regressions)))
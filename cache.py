@@ -0,0 +1,222 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+from werkzeug.utils import import_string
+
+
+# ----------------------------------------------------------------------------#
+# Backends.
+# ----------------------------------------------------------------------------#
+
+class LRUBackend:
+    """
+    In-process least recently used cache with a time to live.
+    Every entry carries a set of tags so writes can evict exactly the entries
+    they make stale.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self._counters = dict(hits=0, misses=0, evictions=0, expirations=0, invalidations=0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            expires, value, tags = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self._counters['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), max_entries=self.max_entries, ttl=self.ttl)
+
+    def _remove(self, key):
+        expires, value, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class NullBackend:
+    """
+    Backend that never stores anything, to disable caching.
+    """
+
+    def __init__(self, max_entries=0, ttl=0):
+        pass
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags=()):
+        pass
+
+    def invalidate(self, tags):
+        return 0
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+# ----------------------------------------------------------------------------#
+# Response cache.
+# ----------------------------------------------------------------------------#
+
+class ResponseCache:
+    """
+    Caches the HTML rendered by GET views, keyed by endpoint, view arguments,
+    query string and the version computed by @conditional, if any. Views tag
+    their entry with the records they display (e.g. "venue:3"), and write
+    handlers invalidate those tags. The backend is chosen with CACHE_BACKEND
+    (an import path) and sized with CACHE_MAX_ENTRIES and CACHE_TTL.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = import_string(app.config.get('CACHE_BACKEND', 'cache.LRUBackend'))
+        self.backend = backend(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+                               ttl=app.config.get('CACHE_TTL', 300))
+        app.extensions['response_cache'] = self
+
+    def cached(self, *tags):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # pages carrying a flashed message are specific to one visitor
+                if request.method != 'GET' or '_flashes' in session:
+                    return view(*args, **kwargs)
+                # under @conditional the page version is part of the key, so a write
+                # through another worker is a miss rather than old HTML under a new ETag
+                key = (request.endpoint, tuple(sorted(request.view_args.items())), request.query_string,
+                       g.get('page_version'))
+                rv = self.backend.get(key)
+                if rv is not None:
+                    return rv
+                g.cache_tags = set(tags)
+                rv = view(*args, **kwargs)
+                if isinstance(rv, str):
+                    self.backend.set(key, rv, g.cache_tags)
+                elif isinstance(rv, Response) and rv.is_streamed and rv.status_code == 200:
+                    rv.response = self.capture(key, rv.response, g.cache_tags)
+                return rv
+            return wrapper
+        return decorator
+
+    def capture(self, key, chunks, tags):
+        """
+        Pass a streamed page through and cache it once it was sent whole.
+        """
+        body = []
+        try:
+            for chunk in chunks:
+                body.append(chunk)
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        self.backend.set(key, ''.join(body), tags)
+
+    def tag(self, *tags):
+        """
+        Add tags to the entry being rendered, if any.
+        """
+        if 'cache_tags' in g:
+            g.cache_tags.update(tags)
+
+    def invalidate(self, *tags):
+        return self.backend.invalidate(tags)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+# ----------------------------------------------------------------------------#
+# Conditional requests.
+# ----------------------------------------------------------------------------#
+
+def conditional(version):
+    """
+    Answer If-None-Match / If-Modified-Since with a 304 before the view runs.
+    version is called with the view arguments and returns the UTC
+    last-modified datetime of the page, or None, and any extra value the page
+    depends on; both go into the ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session:
+                return view(*args, **kwargs)
+            last_modified, extra = version(**kwargs)
+            etag = hashlib.sha1(repr((request.endpoint, kwargs, request.query_string, last_modified, extra))
+                                .encode()).hexdigest()
+            g.page_version = etag
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+            if request.if_none_match:
+                # weak comparison: compression turns the ETag weak
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since)
+            response = Response(status=304) if not_modified else make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,348 @@
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, insert, select
+from werkzeug.utils import import_string
+
+from assets import build_assets
+from models import db, ArchivedShow, Artist, Show, Venue, actual_upcoming_show_count, bump_versions, \
+    counted_models, recount_upcoming_shows
+from profiling import profile_token
+
+
+class LazyCommand(click.Command):
+    """
+    Placeholder importing the module of a command only when that command
+    runs, so the CLI-only modules stay out of the web workers.
+    """
+
+    def __init__(self, name, import_path, short_help):
+        super().__init__(name, short_help=short_help)
+        self.import_path = import_path
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return import_string(self.import_path).make_context(info_name, args, parent=parent, **extra)
+
+
+def register_commands(app):
+    app.cli.add_command(bench_search)
+    app.cli.add_command(bench_datetime)
+    app.cli.add_command(cold_start)
+    app.cli.add_command(explain_routes)
+    app.cli.add_command(rollover_shows)
+    app.cli.add_command(reconcile_show_counts)
+    app.cli.add_command(archive_shows)
+    app.cli.add_command(profile_token)
+    app.cli.add_command(build_assets)
+    app.cli.add_command(LazyCommand('import', 'importer:import_command',
+                                    'Bulk import venues, artists or shows from a CSV or NDJSON file.'))
+    app.cli.add_command(LazyCommand('seed', 'seed:seed_command',
+                                    'Fill the database with a synthetic dataset for benchmarks.'))
+    app.cli.add_command(LazyCommand('benchmark', 'benchmark:benchmark_command',
+                                    'Drive every read endpoint and report latency percentiles.'))
+
+
+# ----------------------------------------------------------------------------#
+# Benchmarks.
+# ----------------------------------------------------------------------------#
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@click.command('bench-search')
+@click.option('--term', 'terms', multiple=True, default=('music', 'band', 'san'), help='Search term to time.')
+@click.option('--repeat', default=50, show_default=True, help='Number of runs per term.')
+@with_appcontext
+def bench_search(terms, repeat):
+    """
+    Time the venue and artist searches against the configured database and
+    report the indexes the planner serves their result query from.
+    """
+    from app import search_queries, search_with_upcoming_counts
+
+    for model in (Venue, Artist):
+        for term in terms:
+            _, results = search_queries(model, term)
+            statement = results.statement.compile(dialect=db.engine.dialect)
+            plan = db.session.connection().exec_driver_sql('EXPLAIN ' + str(statement), statement.params)
+            indexes = sorted({index for _, index, _ in SCAN_PATTERN.findall('\n'.join(row[0] for row in plan))
+                              if index})
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = search_with_upcoming_counts(model, term)
+                timings.append((time.perf_counter() - start) * 1000)
+            click.echo('{:<7} {!r:<10} hits={:<7} median={:.2f}ms p95={:.2f}ms indexes={}'.format(
+                model.__tablename__, term, '{}{}'.format(result['count'], '+' if result['capped'] else ''),
+                statistics.median(timings), percentile(timings, 0.95), ', '.join(indexes) or 'NONE'))
+    db.session.close()
+
+
+@click.command('bench-datetime')
+@click.option('--rows', default=1000, show_default=True, help='Show tiles rendered per run.')
+@click.option('--repeat', default=20, show_default=True, help='Number of runs.')
+def bench_datetime(rows, repeat):
+    """
+    Compare the datetime filter on datetime objects with the previous
+    str() / dateutil / babel.dates.format_datetime round trip.
+    """
+    import babel.dates
+    import dateutil.parser
+    from app import DATETIME_FORMATS, format_datetime
+
+    start_times = [datetime(2026, 1, 1) + timedelta(hours=7 * i) for i in range(rows)]
+
+    def legacy():
+        for start_time in start_times:
+            babel.dates.format_datetime(dateutil.parser.parse(str(start_time)), DATETIME_FORMATS['full'], locale='en')
+
+    def current():
+        for start_time in start_times:
+            format_datetime(start_time, 'full')
+
+    results = {}
+    for name, run in (('legacy', legacy), ('current', current)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+        click.echo('{:<8} {:.2f}ms per {} rows'.format(name, results[name], rows))
+    click.echo('speedup  {:.1f}x'.format(results['legacy'] / results['current']))
+
+
+@click.command('cold-start')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters started.')
+@click.option('--max-ms', default=1500, show_default=True, help='Fail when the median is above this.')
+def cold_start(runs, max_ms):
+    """
+    Time importing app and calling create_app() in a fresh interpreter, the
+    boot of a worker that was not preloaded. Exits non-zero over --max-ms.
+    """
+    code = 'import time; start = time.perf_counter(); from app import create_app; create_app(); ' \
+           'print((time.perf_counter() - start) * 1000)'
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        if result.returncode:
+            raise click.ClickException(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    median = statistics.median(timings)
+    click.echo('cold start  median {:.0f}ms  max {:.0f}ms'.format(median, max(timings)))
+    if median > max_ms:
+        raise click.ClickException('cold start over {}ms'.format(max_ms))
+
+# ----------------------------------------------------------------------------#
+# Query plans.
+# ----------------------------------------------------------------------------#
+
+SCAN_PATTERN = re.compile(r'(Seq Scan|Index Scan|Index Only Scan|Bitmap Index Scan)(?: Backward)?'
+                          r'(?: using (\w+))? on (\w+)')
+
+
+# tables no read route may scan sequentially
+INDEXED_TABLES = ('show', 'show_archive', 'venue', 'artist')
+
+
+def route_requests():
+    """
+    The (method, url, form, expected indexes) requests covering every read
+    route, pointed at the first venue and artist of the database. Each
+    expected index must appear in the plan of one of the route's queries.
+    """
+    venue_id = db.session.query(func.min(Venue.id)).scalar() or 1
+    artist_id = db.session.query(func.min(Artist.id)).scalar() or 1
+    db.session.close()
+    return [
+        ('GET', '/venues', None, {'ix_venue_state_city'}),
+        ('GET', '/venues?genre=Jazz', None, {'ix_venue_genres'}),
+        ('POST', '/venues/search', {'search_term': 'music'}, {'ix_venue_name_trgm', 'ix_venue_city_trgm'}),
+        ('POST', '/venues/search', {'search_term': 'mu'}, {'ix_venue_name_id'}),
+        ('GET', '/venues/{}'.format(venue_id), None,
+         {'ix_show_venue_id_start_time', 'ix_show_archive_venue_id_start_time'}),
+        ('GET', '/artists', None, set()),
+        ('GET', '/artists?genre=Jazz', None, {'ix_artist_genres'}),
+        ('POST', '/artists/search', {'search_term': 'band'}, {'ix_artist_name_trgm', 'ix_artist_city_trgm'}),
+        ('POST', '/artists/search', {'search_term': 'mu'}, {'ix_artist_name_id'}),
+        ('GET', '/artists/{}'.format(artist_id), None,
+         {'ix_show_artist_id_start_time', 'ix_show_archive_artist_id_start_time'}),
+        ('GET', '/shows', None, {'ix_show_start_time_id', 'ix_show_archive_start_time_id'}),
+    ]
+
+
+@click.command('explain-routes')
+@click.option('--natural', is_flag=True,
+              help='Let the planner choose sequential scans (only meaningful on production-sized tables).')
+@with_appcontext
+def explain_routes(natural):
+    """
+    Run every read route through the test client, EXPLAIN each SELECT it
+    issues and report the scans. By default sequential scans are disabled so
+    the check verifies that an index can serve every query even on a small
+    database. A sequential scan of show, show_archive, venue or artist, or
+    an expected index of the route (see route_requests) missing from its
+    plans, fails the check.
+    """
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((conn.engine, statement, parameters))
+
+    client = current_app.test_client()
+    # read-only routes run on the replica when there is one
+    engines = list(db.engines(current_app).values())
+    failures = 0
+    for method, url, form, expected in route_requests():
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            client.open(url, method=method, data=form, buffered=True)
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', capture)
+
+        click.echo('{} {}'.format(method, url))
+        used = set()
+        for engine in engines:
+            statements = [(statement, parameters) for statement_engine, statement, parameters in captured
+                          if statement_engine is engine and statement.lstrip().upper().startswith('SELECT')]
+            if not statements:
+                continue
+            with engine.connect() as connection:
+                if not natural:
+                    connection.exec_driver_sql('SET enable_seqscan = off')
+                for statement, parameters in statements:
+                    plan = '\n'.join(row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters))
+                    for scan, index, table in SCAN_PATTERN.findall(plan):
+                        used.add(index)
+                        failed = scan == 'Seq Scan' and table in INDEXED_TABLES
+                        failures += failed
+                        click.echo('  {:<4} {:<18} {:<12} {}'.format(
+                            'FAIL' if failed else 'ok', scan, table, index))
+        for index in sorted(expected - used):
+            failures += 1
+            click.echo('  FAIL expected index {} not used'.format(index))
+        captured.clear()
+
+    if failures:
+        raise click.ClickException('{} sequential scan(s) or unused expected index(es)'.format(failures))
+
+
+# ----------------------------------------------------------------------------#
+# Upcoming show counters.
+# ----------------------------------------------------------------------------#
+
+@click.command('rollover-shows')
+@click.option('--window', default=120, show_default=True,
+              help='Minutes to look back for shows that have started; should exceed the schedule interval.')
+@with_appcontext
+def rollover_shows(window):
+    """
+    Move shows that have started from upcoming to past by recounting the
+    venues and artists that had a show start within the window. Recounting
+    is idempotent, so overlapping runs are harmless. Meant to run from cron,
+    e.g. hourly.
+    """
+    now = datetime.now()
+    changed = []
+    for model, show_fk in counted_models():
+        ids = db.session.query(show_fk).distinct() \
+            .filter(Show.start_time > now - timedelta(minutes=window), Show.start_time <= now)
+        updated = recount_upcoming_shows(model, show_fk, ids.scalar_subquery())
+        click.echo('{}: {} counter(s) rolled over'.format(model.__tablename__, updated))
+        if updated:
+            changed.append(model)
+    if changed:
+        bump_versions(*changed)
+    db.session.commit()
+
+
+@click.command('reconcile-show-counts')
+@click.option('--fix', is_flag=True, help='Rewrite the counters that drifted.')
+@with_appcontext
+def reconcile_show_counts(fix):
+    """
+    Compare every upcoming show counter with the show table and report the
+    rows that drifted; with --fix, rewrite them.
+    """
+    drifted = 0
+    changed = []
+    for model, show_fk in counted_models():
+        actual = actual_upcoming_show_count(model, show_fk, datetime.now())
+        rows = db.session.query(model.id, model.upcoming_show_count, actual) \
+            .filter(model.upcoming_show_count != actual) \
+            .all()
+        for model_id, stored, expected in rows:
+            click.echo('{} {}: stored {} actual {}'.format(model.__tablename__, model_id, stored, expected))
+        drifted += len(rows)
+        if fix and rows:
+            recount_upcoming_shows(model, show_fk)
+            changed.append(model)
+    if changed:
+        bump_versions(*changed)
+    db.session.commit()
+    click.echo('{} counter(s) drifted{}'.format(drifted, ', fixed' if fix and drifted else ''))
+
+
+# ----------------------------------------------------------------------------#
+# Show archive.
+# ----------------------------------------------------------------------------#
+
+def archive_batch(cutoff, batch_size):
+    """
+    One statement moving up to batch_size shows that started before cutoff,
+    oldest first, into show_archive. Rows locked by a running write are left
+    for the next batch.
+    """
+    columns = ('id', 'venue_id', 'artist_id', 'start_time', 'end_time', 'updated_at')
+    batch = select(Show.id) \
+        .where(Show.start_time < cutoff) \
+        .order_by(Show.start_time, Show.id) \
+        .limit(batch_size) \
+        .with_for_update(skip_locked=True)
+    moved = Show.__table__.delete() \
+        .where(Show.id.in_(batch.scalar_subquery())) \
+        .returning(*[Show.__table__.c[column] for column in columns]) \
+        .cte('moved')
+    return insert(ArchivedShow.__table__) \
+        .from_select(columns, select(*[moved.c[column] for column in columns]))
+
+
+@click.command('archive-shows')
+@click.option('--days', type=click.IntRange(min=1), default=None,
+              help='Archive the shows that started more than this many days ago [default: SHOW_ARCHIVE_AFTER_DAYS].')
+@click.option('--batch-size', default=5000, show_default=True, help='Shows moved per transaction.')
+@click.option('--pause', default=0.1, show_default=True, help='Seconds to sleep between batches.')
+@with_appcontext
+def archive_shows(days, batch_size, pause):
+    """
+    Move past shows from show to show_archive in short transactions of
+    batch-size rows, so the show table, and every upcoming show query, stays
+    small. Meant to run from cron, e.g. nightly; the cutoff must stay older
+    than the rollover-shows window.
+    """
+    days = days or current_app.config['SHOW_ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.now() - timedelta(days=days)
+    total = 0
+    start = time.perf_counter()
+    while True:
+        moved = db.session.execute(archive_batch(cutoff, batch_size)).rowcount
+        db.session.commit()
+        total += moved
+        if moved < batch_size:
+            break
+        click.echo('{} show(s) archived'.format(total))
+        time.sleep(pause)
+    click.echo('{} show(s) older than {} archived in {:.1f}s'.format(total, cutoff.isoformat(' ', 'minutes'),
+                                                                     time.perf_counter() - start))
@@ -0,0 +1,74 @@
+import gzip
+import zlib
+
+from flask import request
+
+COMPRESSIBLE = {'text/html', 'text/css', 'text/csv', 'text/javascript', 'application/javascript',
+                'application/json', 'application/x-ndjson'}
+
+
+def gzip_stream(chunks, level, flush_size):
+    """
+    Compress an iterable of str or bytes chunks as one gzip member, flushing
+    whenever flush_size bytes went in so the client can render the page
+    while the rest is produced.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending = 0
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+class Compress:
+    """
+    Gzips text responses for clients accepting it. Streamed responses are
+    compressed chunk by chunk as they are produced; others at once when they
+    are at least COMPRESS_MIN_SIZE bytes. Responses already carrying a
+    Content-Encoding, such as the precompressed assets, are left alone.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.level = app.config.get('COMPRESS_LEVEL', 6)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        self.flush_size = app.config.get('COMPRESS_FLUSH_SIZE', 16 * 1024)
+        app.after_request(self.compress)
+        app.extensions['compress'] = self
+
+    def compress(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE or not request.accept_encodings['gzip']):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if response.is_streamed:
+            response.response = gzip_stream(response.response, self.level, self.flush_size)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            response.set_data(gzip.compress(body, self.level))
+        response.headers['Content-Encoding'] = 'gzip'
+
+        # the compressed body is another representation of the same content
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
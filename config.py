@@ -1,10 +1,13 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Shared by every worker; must come from the environment outside debug mode.
+SECRET_KEY = os.environ.get('SECRET_KEY')
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Debug mode, off unless FLASK_DEBUG=1 (or the older FLASK_ENV=development):
+# outside it SECRET_KEY is required and structured logging is on.
+DEBUG = os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes') \
+    or os.environ.get('FLASK_ENV') == 'development'
 
 # Connect to the database
 # IMPLEMENT DATABASE URL
@@ -13,4 +16,93 @@ DB_USER = os.environ.get('DB_USER')
 DB_PASSWORD = os.environ.get('DB_PASSWORD')
 DB_NAME = os.environ.get('DB_NAME')
 
-SQLALCHEMY_DATABASE_URI = 'postgresql://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = 'postgresql://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_HOST, DB_NAME)
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Optional read replica serving the read-only routes.
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+SQLALCHEMY_BINDS = {}
+if DB_REPLICA_HOST:
+    SQLALCHEMY_BINDS['replica'] = 'postgresql://{}:{}@{}/{}'.format(DB_USER, DB_PASSWORD, DB_REPLICA_HOST, DB_NAME)
+
+# Connection pool, applied to the primary and the replica.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': True,
+}
+
+# Maximum number of rows returned by the venue and artist searches.
+SEARCH_RESULTS_LIMIT = int(os.environ.get('SEARCH_RESULTS_LIMIT', 50))
+# Matches counted by the searches; beyond it the count shows as "1000+".
+SEARCH_COUNT_LIMIT = int(os.environ.get('SEARCH_COUNT_LIMIT', 1000))
+
+# Number of shows per page of the /shows feed.
+SHOWS_PER_PAGE = int(os.environ.get('SHOWS_PER_PAGE', 30))
+
+# Past shows per page of a venue or artist page, and the age in days from
+# which `flask archive-shows` moves shows to show_archive.
+PAST_SHOWS_PER_PAGE = int(os.environ.get('PAST_SHOWS_PER_PAGE', 12))
+SHOW_ARCHIVE_AFTER_DAYS = int(os.environ.get('SHOW_ARCHIVE_AFTER_DAYS', 1))
+
+# Gzip compression of text responses; streamed pages are flushed to the
+# client every COMPRESS_FLUSH_SIZE bytes of HTML.
+COMPRESS_LEVEL = 6
+COMPRESS_MIN_SIZE = 500
+COMPRESS_FLUSH_SIZE = 16 * 1024
+
+# Longest window, in days, of a /venues/<id>/availability request.
+AVAILABILITY_MAX_DAYS = 92
+
+# Artist/venue matching: weights of the score components and the number of
+# matches returned by default. Past shows together count up to
+# MATCH_HISTORY_CAP.
+MATCH_WEIGHTS = {'genre': 0.6, 'city': 0.2, 'state': 0.1, 'history': 0.1}
+MATCH_HISTORY_CAP = 5
+MATCH_RESULTS = 10
+
+# Search box suggestions: number returned by default, and seconds between
+# two reads, by a background thread, of the rows other workers wrote.
+AUTOCOMPLETE_RESULTS = 8
+AUTOCOMPLETE_REFRESH = 5
+
+# Response cache for the listing and detail pages.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'cache.LRUBackend')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 300))
+
+# Application log (outside debug mode): JSON lines written by a background
+# thread through a bounded queue to error.log, or error.1.log, error.2.log...
+# while other processes hold it, rotated by size.
+LOG_FILE = os.environ.get('LOG_FILE', 'error.log')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_QUEUE_SIZE = 10000
+
+# Per-request metrics appended as JSON lines, and SQL statement budgets per
+# endpoint above which a warning is logged.
+REQUEST_LOG = os.environ.get('REQUEST_LOG', 'requests.jsonl')
+REQUEST_LOG_QUEUE_SIZE = 10000
+DEFAULT_QUERY_BUDGET = 10
+QUERY_BUDGETS = {
+    'main.venues': 3,
+    'main.search_venues': 2,
+    'main.show_venue': 5,
+    'main.artists': 3,
+    'main.search_artists': 2,
+    'main.show_artist': 5,
+    'main.shows': 2,
+}
+
+# Opt-in sampling profiler: requests carrying a token from `flask profile-token`
+# (signed with PROFILE_SECRET) and a PROFILE_SAMPLE_RATE fraction of the others
+# are profiled into PROFILE_DIR.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'profiles'))
@@ -0,0 +1,111 @@
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_app_context, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.pool import QueuePool
+
+REPLICA = 'replica'
+
+
+# ----------------------------------------------------------------------------#
+# Pool.
+# ----------------------------------------------------------------------------#
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool measuring how long checkouts wait for a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+    def stats(self):
+        with self._stats_lock:
+            checkouts, wait_total, wait_max = self._checkouts, self._wait_total, self._wait_max
+        capacity = self.size() + max(self._max_overflow, 0)
+        return {
+            'size': self.size(),
+            'max_overflow': self._max_overflow,
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            'utilisation': round(self.checkedout() / capacity, 3) if capacity else None,
+            'checkouts': checkouts,
+            'wait_ms_avg': round(wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            'wait_ms_max': round(wait_max * 1000, 3),
+        }
+
+
+# ----------------------------------------------------------------------------#
+# Replica routing.
+# ----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending the statements of read-only requests (see read_only) to
+    the replica engine when SQLALCHEMY_BINDS has one. Flushes always go to
+    the primary.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (not self._flushing and has_app_context() and g.get('use_replica')
+                and REPLICA in (self.app.config.get('SQLALCHEMY_BINDS') or {})):
+            return self.db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def engines(self, app):
+        engines = {'primary': self.get_engine(app)}
+        if REPLICA in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            engines[REPLICA] = self.get_engine(app, bind=REPLICA)
+        return engines
+
+    def pool_stats(self, app):
+        return {name: engine.pool.stats() for name, engine in self.engines(app).items()
+                if isinstance(engine.pool, TimedQueuePool)}
+
+    def dispose_engines(self, app):
+        """
+        Drop the connections inherited from the parent process without closing
+        them, which would close the parent's sockets too.
+        """
+        for engine in self.engines(app).values():
+            engine.dispose(close=False)
+
+
+def read_only(view):
+    """
+    Mark a view as read-only so its queries may be served by the replica.
+    A visitor with a pending flashed message has just written something and
+    stays on the primary to read it back.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = '_flashes' not in session
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,26 @@
+import gc
+import multiprocessing
+import os
+
+# Build the app once in the master; workers fork from it and share its memory
+# copy-on-write. create_app() opens no connection, and every worker drops the
+# inherited pool and restarts the request log writer after fork.
+wsgi_app = 'app:create_app()'
+preload_app = True
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', 5000))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+
+def pre_fork(server, worker):
+    # keep the garbage collector from touching, and so copying, the preloaded objects
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # load the search suggestions before the first keystroke reaches the worker
+    app = worker.wsgi
+    with app.app_context():
+        try:
+            app.extensions['autocomplete'].load()
+        except Exception:
+            app.logger.exception('Search suggestions could not be loaded; they load on first use')
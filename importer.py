@@ -0,0 +1,198 @@
+import csv
+import json
+import time
+from collections import Counter
+from datetime import timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from werkzeug.datastructures import MultiDict
+
+from forms import ArtistForm, ShowForm, VenueForm
+from models import db, Artist, Show, Venue, DEFAULT_SHOW_DURATION, bump_versions, counted_models, \
+    recount_upcoming_shows, touch
+
+
+# ----------------------------------------------------------------------------#
+# Row mapping.
+# ----------------------------------------------------------------------------#
+
+def venue_values(form):
+    return dict(name=form.name.data, city=form.city.data, state=form.state.data, address=form.address.data,
+                phone=form.phone.data, facebook_link=form.facebook_link.data, image_link=form.image_link.data,
+                website=form.website_link.data, seeking_talent=form.seeking_talent.data,
+                seeking_description=form.seeking_description.data, genres=form.genres.data)
+
+
+def artist_values(form):
+    return dict(name=form.name.data, city=form.city.data, state=form.state.data, phone=form.phone.data,
+                image_link=form.image_link.data, facebook_link=form.facebook_link.data,
+                website=form.website_link.data, looking_venues=form.seeking_venue.data,
+                seeking_description=form.seeking_description.data, genres=form.genres.data)
+
+
+def show_values(form):
+    duration = timedelta(minutes=form.duration.data) if form.duration.data else DEFAULT_SHOW_DURATION
+    return dict(venue_id=int(form.venue_id.data), artist_id=int(form.artist_id.data),
+                start_time=form.start_time.data, end_time=form.start_time.data + duration)
+
+
+# kind: (model, form validating a row, form to column values)
+KINDS = {
+    'venues': (Venue, VenueForm, venue_values),
+    'artists': (Artist, ArtistForm, artist_values),
+    'shows': (Show, ShowForm, show_values),
+}
+
+
+def read_rows(file, format):
+    """
+    Yield the rows of a CSV or NDJSON file as dicts keyed by form field name.
+    Genres are a list in NDJSON and ";"-separated in CSV.
+    """
+    if format == 'csv':
+        for row in csv.DictReader(file):
+            row['genres'] = [genre for genre in (row.get('genres') or '').split(';') if genre]
+            yield row
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def as_formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            formdata.add(key, item if isinstance(item, str) else json.dumps(item))
+    return formdata
+
+
+# ----------------------------------------------------------------------------#
+# Import.
+# ----------------------------------------------------------------------------#
+
+def missing_references(batch):
+    """
+    Resolve the venue and artist ids of a batch of shows with one query per
+    table and return the set of (column, id) pairs that do not exist.
+    """
+    missing = set()
+    for model, column in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        ids = {values[column] for row, values in batch}
+        found = {model_id for model_id, in db.session.query(model.id).filter(model.id.in_(ids))}
+        missing.update((column, model_id) for model_id in ids - found)
+    return missing
+
+
+def insert_shows(batch, rejects):
+    """
+    Insert a batch of shows in one statement, skipping those overlapping
+    another show of their venue (ex_show_venue_id_time), which are written
+    to the rejects. Returns the batch actually inserted.
+    """
+    inserted = Counter()
+    # a multi-row VALUES binds 5 parameters per show, Postgres accepts 65535
+    for offset in range(0, len(batch), 10000):
+        statement = pg_insert(Show.__table__) \
+            .values([values for row, values in batch[offset:offset + 10000]]) \
+            .on_conflict_do_nothing() \
+            .returning(Show.venue_id, Show.start_time)
+        inserted.update(tuple(key) for key in db.session.execute(statement))
+    kept = []
+    for row, values in batch:
+        key = (values['venue_id'], values['start_time'])
+        if inserted[key]:
+            inserted[key] -= 1
+            kept.append((row, values))
+        else:
+            rejects.write(json.dumps({'row': row, 'errors': {'start_time': ['venue already booked']}},
+                                     default=str) + '\n')
+    return kept
+
+
+def flush(model, batch, rejects):
+    """
+    Insert a batch with a single executemany and commit it. Returns the number
+    of rows inserted.
+    """
+    if model is Show:
+        missing = missing_references(batch)
+        if missing:
+            for row, values in batch:
+                unknown = [column for column in ('venue_id', 'artist_id') if (column, values[column]) in missing]
+                if unknown:
+                    rejects.write(json.dumps({'row': row, 'errors': {column: ['unknown id'] for column in unknown}},
+                                             default=str) + '\n')
+            batch = [(row, values) for row, values in batch
+                     if ('venue_id', values['venue_id']) not in missing
+                     and ('artist_id', values['artist_id']) not in missing]
+    if not batch:
+        return 0
+
+    if model is Show:
+        batch = insert_shows(batch, rejects)
+    else:
+        db.session.execute(insert(model.__table__), [values for row, values in batch])
+    if model is Show and batch:
+        for counted, show_fk in counted_models():
+            ids = {values[show_fk.key] for row, values in batch}
+            recount_upcoming_shows(counted, show_fk, ids)
+            # their pages list the new shows, past ones included
+            touch(counted, ids)
+        bump_versions(Show, Venue, Artist)
+    elif model is not Show:
+        bump_versions(model)
+    db.session.commit()
+    return len(batch)
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('file', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per statement and commit.')
+@click.option('--rejects', 'rejects_path', help='File receiving rejected rows as NDJSON [default: FILE.rejects].')
+@with_appcontext
+def import_command(kind, file, format, batch_size, rejects_path):
+    """
+    Bulk import venues, artists or shows from a CSV or NDJSON file.
+    Every row is validated with the same form as the web pages; invalid rows,
+    shows pointing at unknown venues or artists and shows overlapping another
+    one at their venue are written to the rejects file with their errors.
+    """
+    model, form_class, values_of = KINDS[kind]
+    format = format or ('csv' if file.name.endswith('.csv') else 'ndjson')
+    rejects_path = rejects_path or file.name + '.rejects'
+
+    imported = rejected = 0
+    start = time.perf_counter()
+    with open(rejects_path, 'w') as rejects:
+        batch = []
+        for row in read_rows(file, format):
+            form = form_class(formdata=as_formdata(row), meta={'csrf': False})
+            if not form.validate():
+                rejects.write(json.dumps({'row': row, 'errors': form.errors}, default=str) + '\n')
+                rejected += 1
+                continue
+            try:
+                batch.append((row, values_of(form)))
+            except (TypeError, ValueError) as error:
+                rejects.write(json.dumps({'row': row, 'errors': {'row': [str(error)]}}, default=str) + '\n')
+                rejected += 1
+                continue
+            if len(batch) >= batch_size:
+                count = flush(model, batch, rejects)
+                imported, rejected = imported + count, rejected + len(batch) - count
+                batch = []
+        count = flush(model, batch, rejects)
+        imported, rejected = imported + count, rejected + len(batch) - count
+
+    elapsed = time.perf_counter() - start
+    click.echo('{} {} imported, {} rejected (see {}) in {:.1f}s, {:.0f} rows/s'.format(
+        imported, kind, rejected, rejects_path, elapsed, (imported + rejected) / elapsed if elapsed else 0))
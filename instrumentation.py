@@ -0,0 +1,195 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ----------------------------------------------------------------------------#
+# Writer.
+# ----------------------------------------------------------------------------#
+
+class JSONLinesWriter:
+    """
+    Appends records to a JSON lines file from a background thread, whole
+    lines at a time so that several processes can share the file.
+    write() never blocks: when the bounded queue is full the record is dropped
+    and counted.
+    """
+
+    # records joined into one write
+    batch_lines = 256
+
+    def __init__(self, path, max_pending=10000):
+        self.path = path
+        self.dropped = 0
+        self.max_pending = max_pending
+        self._start()
+        # threads do not survive fork: a preloaded app restarts its writer in every worker
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.close)
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._thread = threading.Thread(target=self._run, name='jsonl-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        # Every worker appends to the same file: each batch of whole lines goes
+        # out in one write() on an O_APPEND descriptor, which the kernel never
+        # interleaves with the writes of other processes.
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            stop = False
+            while not stop:
+                lines = []
+                record = self._queue.get()
+                # take the backlog along, up to a bounded write
+                while record is not None:
+                    lines.append(json.dumps(record, default=str) + '\n')
+                    if self._queue.empty() or len(lines) >= self.batch_lines:
+                        break
+                    record = self._queue.get()
+                stop = record is None
+                if lines:
+                    self._write(fd, lines)
+        finally:
+            os.close(fd)
+
+    def _write(self, fd, lines):
+        # a short write leaves the rest of the batch for another call; an error
+        # such as a full disk counts the batch as dropped
+        data = memoryview(''.join(lines).encode('utf-8'))
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        except OSError:
+            self.dropped += len(lines)
+
+
+# ----------------------------------------------------------------------------#
+# Hooks.
+# ----------------------------------------------------------------------------#
+
+class TimedTemplate(Template):
+    """
+    Template adding its render time to the current request.
+    """
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if has_request_context() and 'metrics' in g:
+                g.metrics['render_ms'] += (time.perf_counter() - start) * 1000
+
+    def generate(self, *args, **kwargs):
+        # streamed pages render, and fetch their lazy rows, while being sent
+        events = super().generate(*args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+            finally:
+                if has_request_context() and 'metrics' in g:
+                    g.metrics['render_ms'] += (time.perf_counter() - start) * 1000
+            yield event
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+    if has_request_context() and 'metrics' in g:
+        metrics = g.metrics
+        metrics['sql_count'] += 1
+        metrics['sql_ms'] += elapsed
+        if elapsed >= metrics['slowest_sql_ms']:
+            metrics['slowest_sql_ms'] = elapsed
+            metrics['slowest_sql'] = statement
+
+
+class RequestMetrics:
+    """
+    Records route, status, latency, template render time, SQL statement count
+    and time, and the slowest statement of every request as one JSON line in
+    REQUEST_LOG. A request issuing more statements than its QUERY_BUDGETS
+    entry (by endpoint) or DEFAULT_QUERY_BUDGET logs a warning.
+    """
+
+    def __init__(self, app=None):
+        self.writer = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.writer = JSONLinesWriter(app.config.get('REQUEST_LOG', 'requests.jsonl'),
+                                      app.config.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+        app.jinja_env.template_class = TimedTemplate
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.extensions['request_metrics'] = self
+
+    def start(self):
+        g.metrics = dict(start=time.perf_counter(), render_ms=0.0, sql_count=0, sql_ms=0.0,
+                         slowest_sql=None, slowest_sql_ms=0.0)
+
+    def finish(self, response):
+        metrics = g.get('metrics')
+        if metrics is None:
+            return response
+        record = {
+            'time': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'status': response.status_code,
+        }
+        # a streamed body is produced after this hook: measure once it was sent
+        response.call_on_close(lambda: self.write(record, metrics))
+        return response
+
+    def write(self, record, metrics):
+        record.update({
+            'latency_ms': round((time.perf_counter() - metrics['start']) * 1000, 3),
+            'render_ms': round(metrics['render_ms'], 3),
+            'sql_count': metrics['sql_count'],
+            'sql_ms': round(metrics['sql_ms'], 3),
+            'slowest_sql_ms': round(metrics['slowest_sql_ms'], 3),
+            'slowest_sql': metrics['slowest_sql'],
+        })
+        self.writer.write(record)
+
+        budget = self.app.config.get('QUERY_BUDGETS', {}).get(record['endpoint'],
+                                                               self.app.config.get('DEFAULT_QUERY_BUDGET'))
+        if budget is not None and record['sql_count'] > budget:
+            self.app.logger.warning('%s issued %d SQL statements, over its budget of %d',
+                                    record['endpoint'], record['sql_count'], budget)
@@ -0,0 +1,151 @@
+import atexit
+import fcntl
+import itertools
+import json
+import logging
+import os
+import queue
+import traceback
+import uuid
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+
+# ----------------------------------------------------------------------------#
+# Records.
+# ----------------------------------------------------------------------------#
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record, with the request id, method, route and path
+    of the request that logged it and the formatted exception, if any.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'pid': record.process,
+        }
+        if has_request_context():
+            entry.update(request_id=g.get('request_id'), method=request.method,
+                         route=request.url_rule.rule if request.url_rule else None, path=request.path)
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler formatting records on the calling thread, where the request
+    context is still available, and dropping them, counted, when the bounded
+    queue is full instead of blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def claim_log_file(path):
+    """
+    The log file of the first free slot and the descriptor locking it:
+    error.log for one process, error.1.log, error.2.log... for the others
+    running at the same time. The lock goes with the process, so a worker
+    started in place of a dead one takes over its file.
+    """
+    root, extension = os.path.splitext(path)
+    for slot in itertools.count():
+        slot_path = path if slot == 0 else '{}.{}{}'.format(root, slot, extension)
+        fd = os.open(slot_path + '.lock', os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return slot_path, fd
+
+
+# ----------------------------------------------------------------------------#
+# Extension.
+# ----------------------------------------------------------------------------#
+
+class StructuredLogging:
+    """
+    Sends app.logger through a bounded queue to a background thread writing
+    JSON lines to LOG_FILE, or to a numbered file next to it while another
+    process holds it (see claim_log_file), rotated at LOG_MAX_BYTES with
+    LOG_BACKUP_COUNT backups. Every request gets an id, taken from the
+    X-Request-ID header when present and echoed in the response.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_pending = app.config.get('LOG_QUEUE_SIZE', 10000)
+        self.file_handler = None
+        self.lock_fd = None
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=self.max_pending))
+        self.handler.setFormatter(JSONFormatter())
+        self._start()
+        # the listener thread does not survive fork: every worker starts its own
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.close)
+
+        app.logger.setLevel(app.config.get('LOG_LEVEL', logging.INFO))
+        # Flask's own handler writes to stderr on the request thread
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self.handler)
+        app.before_request(self.assign_request_id)
+        app.after_request(self.echo_request_id)
+        app.extensions['structured_logging'] = self
+
+    def _start(self):
+        # one writer per file: handlers in different workers rotating the same
+        # file would rename it under each other. A forked worker drops the
+        # file of its parent, whose lock it shares, and claims its own.
+        if self.file_handler is not None:
+            self.file_handler.close()
+            os.close(self.lock_fd)
+        path, self.lock_fd = claim_log_file(self.app.config.get('LOG_FILE', 'error.log'))
+        self.file_handler = RotatingFileHandler(path,
+                                                maxBytes=self.app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                                backupCount=self.app.config.get('LOG_BACKUP_COUNT', 5), delay=True)
+        self.handler.queue = queue.Queue(maxsize=self.max_pending)
+        self.listener = QueueListener(self.handler.queue, self.file_handler)
+        self.listener.start()
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def assign_request_id(self):
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+
+    def echo_request_id(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    def stats(self):
+        return {
+            'pending': self.handler.queue.qsize(),
+            'max_pending': self.max_pending,
+            'dropped': self.handler.dropped,
+        }
@@ -0,0 +1,239 @@
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+from sqlalchemy import func
+
+from forms import GENRES
+from models import db, Artist, Venue, all_shows
+
+GENRE_BITS = {genre: 1 << bit for bit, genre in enumerate(GENRES)}
+# rows updated this long before the watermark are read again, in case their
+# transaction committed after a later one
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+@lru_cache(maxsize=None)
+def word_popcount():
+    """
+    Number of set bits of every 16-bit word, built on the first match.
+    """
+    return ((np.arange(1 << 16)[:, None] >> np.arange(16)) & 1).sum(axis=1).astype(np.float32)
+
+
+def popcount(bitsets):
+    """
+    Number of set bits of every genre bitset, as float32, summed over its
+    16-bit words so that the table does not grow with GENRES.
+    """
+    table = word_popcount()
+    counts = table[bitsets & 0xffff]
+    for shift in range(16, len(GENRES), 16):
+        counts += table[(bitsets >> shift) & 0xffff]
+    return counts
+
+
+def genre_bits(genres):
+    bits = 0
+    for genre in genres or ():
+        bits |= GENRE_BITS.get(genre, 0)
+    return bits
+
+
+# ----------------------------------------------------------------------------#
+# Index.
+# ----------------------------------------------------------------------------#
+
+class EntityIndex:
+    """
+    Columns of every venue or artist the scoring needs, as NumPy arrays: the
+    genres as a bitset, the city and state as interned codes and whether the
+    row is open to bookings. Rows updated since the last refresh are read
+    again through the updated_at index, so every worker catches up with the
+    writes of the others. The code table is shared by the artist and venue
+    indexes, so a city has the same code in both.
+    """
+
+    def __init__(self, model, open_column, codes):
+        self.model = model
+        self.open_column = open_column
+        self.size = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.genres = np.zeros(0, dtype=np.int64)
+        self.cities = np.zeros(0, dtype=np.int32)
+        self.states = np.zeros(0, dtype=np.int32)
+        self.open = np.zeros(0, dtype=bool)
+        self.rows = {}
+        self.codes = codes
+        self.watermark = None
+
+    def code(self, value):
+        return self.codes.setdefault(value, len(self.codes))
+
+    def refresh(self):
+        model = self.model
+        query = db.session.query(model.id, model.genres, model.city, model.state, self.open_column.label('open'),
+                                 model.updated_at)
+        if self.watermark is not None:
+            query = query.filter(model.updated_at >= self.watermark - REFRESH_OVERLAP)
+        rows = query.all()
+        if rows:
+            self.upsert(rows)
+            self.watermark = max(self.watermark or datetime.min, max(row.updated_at for row in rows))
+        return len(rows)
+
+    def upsert(self, rows):
+        positions = []
+        size = self.size
+        for row in rows:
+            if row.id not in self.rows:
+                self.rows[row.id] = size
+                size += 1
+            positions.append(self.rows[row.id])
+        if size > len(self.ids):
+            self.grow(max(size, 2 * len(self.ids)))
+        self.size = size
+        self.ids[positions] = [row.id for row in rows]
+        self.genres[positions] = [genre_bits(row.genres) for row in rows]
+        self.states[positions] = [self.code((row.state or '').lower()) for row in rows]
+        self.cities[positions] = [self.code(((row.state or '').lower(), (row.city or '').strip().lower()))
+                                  for row in rows]
+        self.open[positions] = [bool(row.open) for row in rows]
+
+    def grow(self, capacity):
+        for name in ('ids', 'genres', 'cities', 'states', 'open'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def discard(self, ids):
+        """
+        Close rows that no longer exist, so they are never proposed again.
+        """
+        for entity_id in ids:
+            position = self.rows.get(entity_id)
+            if position is not None:
+                self.open[position] = False
+
+
+# ----------------------------------------------------------------------------#
+# Scoring.
+# ----------------------------------------------------------------------------#
+
+class MatchEngine:
+    """
+    Ranks the venues seeking talent for an artist, or the artists looking
+    for venues for a venue, by a weighted sum of genre overlap (Jaccard over
+    the genre bitsets), same city, same state and past shows together
+    (MATCH_WEIGHTS). Scores are computed over the whole index with NumPy, so
+    a top-k over 100k rows takes milliseconds.
+    """
+
+    def __init__(self, app=None):
+        self.indexes = {}
+        # city and state codes, common to both indexes
+        self.codes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.weights = app.config.get('MATCH_WEIGHTS', {'genre': 0.6, 'city': 0.2, 'state': 0.1, 'history': 0.1})
+        self.history_cap = app.config.get('MATCH_HISTORY_CAP', 5)
+        app.extensions['match_engine'] = self
+
+    def index(self, model):
+        if model not in self.indexes:
+            self.indexes[model] = EntityIndex(model, Artist.looking_venues if model is Artist else Venue.seeking_talent,
+                                              self.codes)
+        return self.indexes[model]
+
+    def refresh(self, *models):
+        """
+        Apply the rows written since the last refresh; called by the write
+        handlers and before every match. An index not built yet is left for
+        its first match to load whole.
+        """
+        with self._lock:
+            for model in models:
+                if model in self.indexes:
+                    self.indexes[model].refresh()
+
+    def discard(self, model, ids):
+        with self._lock:
+            if model in self.indexes:
+                self.indexes[model].discard(ids)
+
+    def history(self, model, entity_id):
+        """
+        Past shows of an entity per counterparty id, archived ones included,
+        from the show indexes.
+        """
+        shows = all_shows()
+        if model is Artist:
+            own_fk, other_fk = shows.c.artist_id, shows.c.venue_id
+        else:
+            own_fk, other_fk = shows.c.venue_id, shows.c.artist_id
+        return db.session.query(other_fk, func.count()) \
+            .filter(own_fk == entity_id, shows.c.start_time < datetime.now()) \
+            .group_by(other_fk) \
+            .all()
+
+    def score(self, source, position, target, history=()):
+        """
+        Scores of every row of the target index against the row at position
+        of the source index.
+
+        >>> from collections import namedtuple
+        >>> Row = namedtuple('Row', 'id genres city state open')
+        >>> engine = MatchEngine()
+        >>> engine.weights, engine.history_cap = {'genre': 0.6, 'city': 0.2, 'state': 0.1, 'history': 0.1}, 5
+        >>> artists, venues = engine.index(Artist), engine.index(Venue)
+        >>> artists.upsert([Row(1, ['Jazz', 'Blues'], 'San Francisco', 'CA', True)])
+        >>> venues.upsert([Row(7, ['Jazz'], 'Oakland', 'CA', True), Row(8, ['Jazz'], 'San Francisco', 'CA', True)])
+        >>> [round(float(score), 4) for score in engine.score(artists, 0, venues)]
+        [0.4, 0.6]
+        """
+        size = target.size
+        genres = source.genres[position]
+        weights = self.weights
+
+        union = popcount(target.genres[:size] | genres)
+        shared = popcount(target.genres[:size] & genres)
+        scores = weights['genre'] * np.divide(shared, union, out=np.zeros(size, dtype=np.float32),
+                                              where=union > 0)
+        scores += weights['city'] * (target.cities[:size] == source.cities[position])
+        scores += weights['state'] * (target.states[:size] == source.states[position])
+        if history:
+            positions = [target.rows[other_id] for other_id, _ in history if other_id in target.rows]
+            counts = [min(count, self.history_cap) for other_id, count in history if other_id in target.rows]
+            scores[positions] += weights['history'] * np.array(counts, dtype=np.float32) / self.history_cap
+        return scores
+
+    def matches(self, model, entity_id, limit=10):
+        """
+        The limit best (candidate id, score) pairs for the venue or artist
+        entity_id, or None when it does not exist.
+        """
+        target_model = Venue if model is Artist else Artist
+        history = self.history(model, entity_id)
+        with self._lock:
+            source, target = self.index(model), self.index(target_model)
+            source.refresh()
+            target.refresh()
+            position = source.rows.get(entity_id)
+            if position is None:
+                return None
+            scores = self.score(source, position, target, history)
+            size = target.size
+            scores[~target.open[:size]] = -np.inf
+
+            limit = min(limit, int(np.count_nonzero(target.open[:size])))
+            if limit <= 0:
+                return []
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [(int(target.ids[i]), float(scores[i])) for i in best]
+
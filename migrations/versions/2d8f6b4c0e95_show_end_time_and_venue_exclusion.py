@@ -0,0 +1,37 @@
+"""show end time and the venue double-booking exclusion constraint
+
+Revision ID: 2d8f6b4c0e95
+Revises: 9c3e5a7b1d48
+Create Date: 2026-10-18 14:22:40.517093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d8f6b4c0e95'
+down_revision = '9c3e5a7b1d48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # btree_gist provides the = operator on integers inside a GiST index
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows get the default duration of two hours
+    op.execute("UPDATE show SET end_time = start_time + interval '2 hours'")
+    op.alter_column('show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_show_end_after_start', 'show', 'end_time > start_time')
+    # fails while overlapping shows of a venue remain: list them with
+    #   SELECT a.id, b.id FROM show a JOIN show b ON a.venue_id = b.venue_id AND a.id < b.id
+    #   AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time)
+    op.execute('ALTER TABLE show ADD CONSTRAINT ex_show_venue_id_time '
+               'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    op.drop_constraint('ex_show_venue_id_time', 'show')
+    op.drop_constraint('ck_show_end_after_start', 'show')
+    op.drop_column('show', 'end_time')
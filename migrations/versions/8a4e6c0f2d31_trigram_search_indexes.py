@@ -0,0 +1,30 @@
+"""trigram search indexes on venue and artist names
+
+Revision ID: 8a4e6c0f2d31
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 09:40:52.104377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c0f2d31'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venue', 'artist'):
+        for column in ('name', 'city'):
+            op.create_index('ix_{}_{}_trgm'.format(table, column), table, [column], unique=False,
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('venue', 'artist'):
+        for column in ('name', 'city'):
+            op.drop_index('ix_{}_{}_trgm'.format(table, column), table_name=table)
@@ -1,11 +1,21 @@
+from datetime import datetime, timedelta
+
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import ARRAY, ExcludeConstraint, insert as pg_insert
+
+from database import RoutingSQLAlchemy, TimedQueuePool
+
+db = RoutingSQLAlchemy()
 
-db = SQLAlchemy()
+# length of a show listed without a duration
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+# SQLSTATE of a show overlapping another one at its venue (ex_show_venue_id_time)
+EXCLUSION_VIOLATION = '23P01'
 
 
-def initialization(app):
-    app.config.from_object('config')
+def initialization(app, config='config'):
+    app.config.from_object(config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].setdefault('poolclass', TimedQueuePool)
     db.app = app
     db.init_app(app)
     migrate = Migrate(app, db)
@@ -21,6 +31,13 @@ class Venue(db.Model):
     Venue table
     """
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venue_name_id', 'name', 'id'),
+        db.Index('ix_venue_state_city', 'state', 'city'),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -33,7 +50,10 @@ class Venue(db.Model):
     website = db.Column(db.String(500), nullable=True)
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.TEXT(), nullable=True)
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(ARRAY(db.String))
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(), nullable=False, index=True, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
 
 
 class Artist(db.Model):
@@ -41,18 +61,28 @@ class Artist(db.Model):
     Artist table
     """
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_state_city', 'state', 'city'),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=True)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(ARRAY(db.String), nullable=False)
     image_link = db.Column(db.String(500), nullable=True)
     facebook_link = db.Column(db.String(120), nullable=True)
     website = db.Column(db.String(500), nullable=True)
     looking_venues = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.TEXT(), nullable=True)
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime(), nullable=False, index=True, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
 
 
 class Show(db.Model):
@@ -60,10 +90,142 @@ class Show(db.Model):
     show table
     """
     __tablename__ = "show"
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('end_time > start_time', name='ck_show_end_after_start'),
+        # a venue hosts one show at a time; the GiST index behind it also serves
+        # the availability range queries
+        ExcludeConstraint(('venue_id', '='), (db.func.tsrange(db.column('start_time'), db.column('end_time')), '&&'),
+                          using='gist', name='ex_show_venue_id_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.ForeignKey("venue.id"), nullable=False)
     artist_id = db.Column(db.ForeignKey("artist.id"), nullable=False)
     start_time = db.Column(db.DateTime(), nullable=False)
+    end_time = db.Column(db.DateTime(), nullable=False)
+    updated_at = db.Column(db.DateTime(), nullable=False, index=True, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
     venue = db.relationship("Venue", backref="show", lazy=True, cascade="all")
     artist = db.relationship("Artist", backref="show", lazy=True, cascade="all")
+
+
+class ArchivedShow(db.Model):
+    """
+    show_archive table: past shows moved out of show by `flask archive-shows`,
+    keeping their id, so that show only holds the recent and upcoming ones
+    """
+    __tablename__ = "show_archive"
+    __table_args__ = (
+        db.Index('ix_show_archive_venue_id_start_time', 'venue_id', 'start_time', 'id'),
+        db.Index('ix_show_archive_artist_id_start_time', 'artist_id', 'start_time', 'id'),
+        db.Index('ix_show_archive_start_time_id', 'start_time', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    venue_id = db.Column(db.ForeignKey("venue.id"), nullable=False)
+    artist_id = db.Column(db.ForeignKey("artist.id"), nullable=False)
+    start_time = db.Column(db.DateTime(), nullable=False)
+    end_time = db.Column(db.DateTime(), nullable=False)
+    updated_at = db.Column(db.DateTime(), nullable=False)
+    archived_at = db.Column(db.DateTime(), nullable=False, server_default=db.text("timezone('utc', now())"))
+
+
+class TableVersion(db.Model):
+    """
+    table_version table: a counter per table that every transaction writing
+    the table increments, and the number of those transactions that deleted
+    rows from it
+    """
+    __tablename__ = "table_version"
+
+    name = db.Column(db.String(63), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    deletions = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+
+
+def all_shows():
+    """
+    Subquery of the shows of both tables. Filters on it reach the indexes of
+    each table, and an ORDER BY ... LIMIT merges their ordered index scans.
+    """
+    columns = ('id', 'venue_id', 'artist_id', 'start_time', 'end_time')
+    return db.union_all(
+        db.select(*[getattr(Show, column) for column in columns]),
+        db.select(*[getattr(ArchivedShow, column) for column in columns])
+    ).subquery('all_shows')
+
+
+# ----------------------------------------------------------------------------#
+# Upcoming show counters.
+# ----------------------------------------------------------------------------#
+
+def counted_models():
+    """
+    The models carrying an upcoming_show_count, with their foreign key on show.
+    """
+    return ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+
+def adjust_upcoming_show_count(venue_id, artist_id, start_time, delta):
+    """
+    Add delta to the counters of a venue and an artist when the show starting
+    at start_time is upcoming. Runs in the caller's transaction.
+    """
+    if start_time <= datetime.now():
+        return
+    for model, model_id in ((Venue, venue_id), (Artist, artist_id)):
+        db.session.query(model).filter(model.id == model_id).update(
+            {model.upcoming_show_count: model.upcoming_show_count + delta}, synchronize_session=False)
+
+
+def touch(model, ids):
+    """
+    Bump updated_at of the given rows, e.g. when the shows they list change.
+    """
+    db.session.query(model).filter(model.id.in_(ids)) \
+        .update({model.updated_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def bump_versions(*models, deleted=()):
+    """
+    Increment the versions of the tables of models and deleted, and the
+    deletion count of deleted, in the caller's transaction; call it last
+    before the commit. The row lock taken here is held until then, so a
+    transaction bumping a version after another one also commits after it:
+    versions grow in commit order.
+    """
+    names = {model.__tablename__ for model in models + tuple(deleted)}
+    deleted = {model.__tablename__ for model in deleted}
+    # always in the same order, so two transactions never wait on each other's rows
+    rows = [{'name': name, 'version': 1, 'deletions': int(name in deleted)} for name in sorted(names)]
+    statement = pg_insert(TableVersion.__table__).values(rows)
+    db.session.execute(statement.on_conflict_do_update(index_elements=['name'], set_={
+        'version': TableVersion.version + 1,
+        'deletions': TableVersion.deletions + statement.excluded.deletions,
+    }))
+
+
+def actual_upcoming_show_count(model, show_fk, now):
+    """
+    Correlated subquery counting the upcoming shows of each row of model.
+    """
+    return db.session.query(db.func.count(Show.id)) \
+        .filter(show_fk == model.id, Show.start_time > now) \
+        .correlate(model) \
+        .scalar_subquery()
+
+
+def recount_upcoming_shows(model, show_fk, ids=None):
+    """
+    Recompute the counters of model from the show table, for the given ids or
+    for every row. Returns the number of rows updated.
+    """
+    query = db.session.query(model)
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    actual = actual_upcoming_show_count(model, show_fk, datetime.now())
+    return query.filter(model.upcoming_show_count != actual) \
+        .update({model.upcoming_show_count: actual}, synchronize_session=False)
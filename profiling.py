@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import click
+from flask import current_app, g, has_request_context, request
+from flask.cli import with_appcontext
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ----------------------------------------------------------------------------#
+# Sampler.
+# ----------------------------------------------------------------------------#
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval from a background
+    thread and counts identical stacks, the collapsed-stack format read by
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.most_common())
+
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profile' in g:
+        g.profile['statements'].append(statement)
+
+
+# ----------------------------------------------------------------------------#
+# Profiler.
+# ----------------------------------------------------------------------------#
+
+class RequestProfiler:
+    """
+    Opt-in sampling profiler. With PROFILING_ENABLED, a request is profiled
+    when it carries a token signed with PROFILE_SECRET (X-Profile header or
+    _profile query argument, see `flask profile-token`), or at random for a
+    PROFILE_SAMPLE_RATE fraction of the traffic. Each profile is written to
+    PROFILE_DIR as a .collapsed stack file with a .json sidecar holding the
+    route and the SQL statements issued.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+        if not event.contains(Engine, 'before_cursor_execute', record_statement):
+            event.listen(Engine, 'before_cursor_execute', record_statement)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.extensions['request_profiler'] = self
+
+    def serializer(self):
+        return URLSafeTimedSerializer(self.app.config['PROFILE_SECRET'], salt='profile')
+
+    def requested(self):
+        token = request.headers.get('X-Profile') or request.args.get('_profile')
+        if not token or not self.app.config.get('PROFILE_SECRET'):
+            return False
+        try:
+            self.serializer().loads(token, max_age=self.app.config.get('PROFILE_TOKEN_MAX_AGE', 3600))
+        except BadSignature:
+            return False
+        return True
+
+    def start(self):
+        if not (self.requested() or random.random() < self.app.config.get('PROFILE_SAMPLE_RATE', 0.0)):
+            return
+        sampler = StackSampler(threading.get_ident(), self.app.config.get('PROFILE_INTERVAL', 0.005))
+        g.profile = dict(sampler=sampler, statements=[], start=time.perf_counter())
+        sampler.start()
+
+    def finish(self, response):
+        profile = g.get('profile')
+        if profile is None:
+            return response
+        profile.update(method=request.method, route=request.url_rule.rule if request.url_rule else None,
+                       path=request.full_path, endpoint=request.endpoint, status=response.status_code)
+        # keep sampling while a streamed body is produced
+        response.call_on_close(lambda: self.write(profile))
+        return response
+
+    def write(self, profile):
+        profile['sampler'].stop()
+        duration = time.perf_counter() - profile['start']
+
+        directory = self.app.config.get('PROFILE_DIR', 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        name = '{}_{}_{}'.format(datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'), profile['endpoint'] or 'unknown',
+                                 os.getpid())
+        with open(os.path.join(directory, name + '.collapsed'), 'w') as file:
+            file.write(profile['sampler'].collapsed())
+        with open(os.path.join(directory, name + '.json'), 'w') as file:
+            json.dump({
+                'method': profile['method'],
+                'route': profile['route'],
+                'path': profile['path'],
+                'status': profile['status'],
+                'duration_ms': round(duration * 1000, 3),
+                'samples': sum(profile['sampler'].stacks.values()),
+                'statements': profile['statements'],
+            }, file, indent=2)
+
+
+@click.command('profile-token')
+@with_appcontext
+def profile_token():
+    """
+    Print a token enabling the profiler for requests that send it as the
+    X-Profile header or the _profile query argument.
+    """
+    if not current_app.config.get('PROFILE_SECRET'):
+        raise click.ClickException('PROFILE_SECRET is not set')
+    profiler = current_app.extensions.get('request_profiler')
+    if profiler is None:
+        raise click.ClickException('PROFILING_ENABLED is off')
+    click.echo(profiler.serializer().dumps('profile'))
@@ -0,0 +1,136 @@
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db, Artist, Show, Venue, DEFAULT_SHOW_DURATION, bump_versions, counted_models, \
+    recount_upcoming_shows
+
+# (city, state, weight): a few large markets and a long tail
+CITIES = [
+    ('New York', 'NY', 30), ('Los Angeles', 'CA', 24), ('Chicago', 'IL', 16), ('San Francisco', 'CA', 14),
+    ('Austin', 'TX', 12), ('Nashville', 'TN', 12), ('Seattle', 'WA', 9), ('New Orleans', 'LA', 9),
+    ('Atlanta', 'GA', 8), ('Boston', 'MA', 7), ('Denver', 'CO', 6), ('Portland', 'OR', 6),
+    ('Philadelphia', 'PA', 5), ('Miami', 'FL', 5), ('Detroit', 'MI', 4), ('Minneapolis', 'MN', 4),
+    ('Memphis', 'TN', 3), ('Kansas City', 'MO', 3), ('Salt Lake City', 'UT', 2), ('Richmond', 'VA', 2),
+    ('Albuquerque', 'NM', 1), ('Boise', 'ID', 1), ('Burlington', 'VT', 1), ('Anchorage', 'AK', 1),
+]
+# (genre, weight), genres as offered by the forms
+GENRES = [
+    ('Rock n Roll', 20), ('Pop', 16), ('Hip-Hop', 14), ('Alternative', 10), ('Electronic', 9), ('Jazz', 7),
+    ('R&B', 6), ('Country', 6), ('Folk', 5), ('Punk', 4), ('Heavy Metal', 4), ('Blues', 4), ('Soul', 3),
+    ('Reggae', 3), ('Funk', 2), ('Classical', 2), ('Instrumental', 1), ('Musical Theatre', 1), ('Other', 1),
+]
+WORDS = ['Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Rusty', 'Crimson', 'Silver', 'Wild', 'Lucky',
+         'Hollow', 'Neon', 'Iron', 'Paper', 'Broken', 'Cosmic', 'Honey', 'Stone', 'Lonesome', 'Gravity']
+VENUE_NOUNS = ['Hall', 'Room', 'Lounge', 'Tavern', 'Club', 'Theatre', 'Garden', 'Warehouse', 'Bar', 'Ballroom']
+ARTIST_NOUNS = ['Band', 'Collective', 'Trio', 'Orchestra', 'Kids', 'Sound', 'Brothers', 'Sisters', 'Project']
+
+
+def weighted(rng, items):
+    """
+    Sampler drawing from (value..., weight) tuples according to their weights.
+    """
+    values = [item[:-1] if len(item) > 2 else item[0] for item in items]
+    cumulative = list(accumulate(item[-1] for item in items))
+    return lambda k=1: rng.choices(values, cum_weights=cumulative, k=k)
+
+
+def skewed_ids(rng, first_id, last_id):
+    """
+    Sampler over an id range where low ids are much more popular, so a few
+    venues and artists carry most of the shows.
+    """
+    span = last_id - first_id + 1
+    scale = max(1, span / 50)
+    return lambda: first_id + int((rng.paretovariate(1.2) - 1) * scale) % span
+
+
+def insert_batches(statement, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(statement, batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(statement, batch)
+        db.session.commit()
+
+
+def id_range(model):
+    return db.session.query(func.min(model.id), func.max(model.id)).one()
+
+
+@click.command('seed')
+@click.option('--venues', default=10000, show_default=True)
+@click.option('--artists', default=100000, show_default=True)
+@click.option('--shows', default=2000000, show_default=True)
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--random-seed', default=42, show_default=True, help='Seed making the dataset reproducible.')
+@with_appcontext
+def seed_command(venues, artists, shows, batch_size, random_seed):
+    """
+    Fill the database with a synthetic dataset for benchmarks: cities and
+    genres follow a long-tailed distribution and a few venues and artists
+    carry most of the shows, spread from two years ago to one year ahead.
+    """
+    rng = random.Random(random_seed)
+    city = weighted(rng, CITIES)
+    genre = weighted(rng, GENRES)
+
+    def genres():
+        return sorted(set(genre(rng.randint(1, 3))))
+
+    def name(nouns):
+        return '{} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), rng.choice(nouns))
+
+    start = time.perf_counter()
+
+    def venue_rows():
+        for i in range(venues):
+            (city_name, state), = city()
+            yield dict(name=name(VENUE_NOUNS), city=city_name, state=state, address='{} Main St'.format(i + 1),
+                       phone='555-555-{:04d}'.format(i % 10000), genres=genres(),
+                       seeking_talent=rng.random() < 0.3, seeking_description=None)
+
+    def artist_rows():
+        for i in range(artists):
+            (city_name, state), = city()
+            yield dict(name=name(ARTIST_NOUNS), city=city_name, state=state,
+                       phone='555-555-{:04d}'.format(i % 10000), genres=genres(),
+                       looking_venues=rng.random() < 0.4, seeking_description=None)
+
+    insert_batches(insert(Venue.__table__), venue_rows(), batch_size)
+    click.echo('{} venues'.format(venues))
+    insert_batches(insert(Artist.__table__), artist_rows(), batch_size)
+    click.echo('{} artists'.format(artists))
+
+    venue_id = skewed_ids(rng, *id_range(Venue))
+    artist_id = skewed_ids(rng, *id_range(Artist))
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def show_rows():
+        for _ in range(shows):
+            # roughly two thirds of the shows are in the past
+            start_time = now + timedelta(hours=rng.randint(-2 * 365 * 24, 365 * 24))
+            yield dict(venue_id=venue_id(), artist_id=artist_id(), start_time=start_time,
+                       end_time=start_time + DEFAULT_SHOW_DURATION)
+
+    # shows double-booking a popular venue are dropped by its exclusion constraint
+    existing = db.session.query(func.count(Show.id)).scalar()
+    insert_batches(pg_insert(Show.__table__).on_conflict_do_nothing(), show_rows(), batch_size)
+    inserted = db.session.query(func.count(Show.id)).scalar() - existing
+    click.echo('{} shows ({} overlapping dropped)'.format(inserted, shows - inserted))
+
+    for model, show_fk in counted_models():
+        recount_upcoming_shows(model, show_fk)
+    bump_versions(Venue, Artist, Show)
+    db.session.commit()
+    click.echo('seeded in {:.0f}s'.format(time.perf_counter() - start))
@@ -2,3 +2,66 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Search box suggestions from /autocomplete, asked for on every keystroke.
+// Picking a venue or an artist opens its page; picking a city searches it.
+(function () {
+  var forms = document.querySelectorAll('form.search[data-suggest]');
+  Array.prototype.forEach.call(forms, function (form) {
+    var type = form.getAttribute('data-suggest');
+    var input = form.querySelector('input[name="search_term"]');
+    var list = form.querySelector('datalist');
+    var links = {};
+    var pending = null;
+
+    function show(data) {
+      var results = data[type];
+      list.innerHTML = '';
+      links = {};
+      results.names.forEach(function (item) {
+        var option = document.createElement('option');
+        option.value = item.name;
+        option.label = item.city + ', ' + item.state;
+        list.appendChild(option);
+        links[item.name] = '/' + type + '/' + item.id;
+      });
+      results.cities.forEach(function (item) {
+        if (item.city in links) {
+          return;
+        }
+        var option = document.createElement('option');
+        option.value = item.city;
+        option.label = item.state + ' — ' + item.count + ' ' + type;
+        list.appendChild(option);
+      });
+    }
+
+    input.addEventListener('input', function (event) {
+      var value = input.value;
+      // a suggestion was picked
+      if (value in links && (!event.inputType || event.inputType === 'insertReplacementText')) {
+        window.location = links[value];
+        return;
+      }
+      if (event.inputType === 'insertReplacementText') {
+        form.submit();
+        return;
+      }
+      if (pending) {
+        pending.abort();
+      }
+      if (!value.trim()) {
+        list.innerHTML = '';
+        return;
+      }
+      pending = new XMLHttpRequest();
+      pending.open('GET', '/autocomplete?type=' + type + '&q=' + encodeURIComponent(value));
+      pending.onload = function () {
+        if (this.status === 200) {
+          show(JSON.parse(this.responseText));
+        }
+      };
+      pending.send();
+    });
+  });
+})();
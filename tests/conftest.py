@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+import pytest
+
+# create_app() needs a secret outside debug mode; logs and metrics go to a scratch directory
+scratch = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('LOG_FILE', os.path.join(scratch, 'error.log'))
+os.environ.setdefault('REQUEST_LOG', os.path.join(scratch, 'requests.jsonl'))
+
+
+@pytest.fixture(scope='session')
+def app():
+    # the extensions are module globals: one application serves every test
+    from app import create_app
+    return create_app()
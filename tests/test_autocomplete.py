@@ -0,0 +1,56 @@
+from collections import namedtuple
+from datetime import datetime
+
+from autocomplete import Autocomplete, EntitySuggestions
+from models import Venue
+
+Row = namedtuple('Row', 'id name city state upcoming_show_count updated_at')
+
+
+def row(entity_id, name, city='San Francisco', updated_at=datetime(2026, 1, 1)):
+    return Row(entity_id, name, city, 'CA', 0, updated_at)
+
+
+def loaded(rows):
+    entities = EntitySuggestions(Venue)
+    entities.apply(rows, 0, None)
+    return entities
+
+
+def names(entities, prefix):
+    return [data['name'] for data in entities.names.top(prefix, 8)]
+
+
+def test_apply_updates_and_adds():
+    entities = loaded([row(1, 'The Musical Hop'), row(2, 'Park Square Live Music & Coffee')])
+    entities.apply([row(1, 'The Dueling Pianos Bar', 'New York', datetime(2026, 1, 2)), row(3, 'Musicians Hall')],
+                   0, None)
+    assert names(entities, 'mus') == ['Musicians Hall', 'Park Square Live Music & Coffee']
+    assert names(entities, 'duel') == ['The Dueling Pianos Bar']
+    assert entities.city_counts == {('San Francisco', 'CA'): 2, ('New York', 'CA'): 1}
+    assert entities.watermark == datetime(2026, 1, 2)
+
+
+def test_deletions_drop_the_missing_ids():
+    entities = loaded([row(1, 'The Musical Hop'), row(2, 'Park Square Live Music & Coffee')])
+    # a delete and an insert elsewhere leave the row count unchanged
+    entities.apply([row(3, 'Musicians Hall')], 1, {2, 3})
+    assert names(entities, 'mus') == ['Musicians Hall', 'Park Square Live Music & Coffee']
+    assert names(entities, 'hop') == []
+    assert entities.deletions == 1
+
+
+def test_refresh_applies_changes_read_outside_the_lock(monkeypatch):
+    suggestions = Autocomplete()
+    suggestions.limit = 8
+    entities = loaded([row(1, 'The Musical Hop')])
+    suggestions.entities = {Venue: entities}
+
+    def changes():
+        # suggestions are not held up while the changes are read
+        assert not suggestions._lock.locked()
+        return [row(2, 'Musicians Hall')], 0, None
+    monkeypatch.setattr(entities, 'changes', changes)
+    suggestions.refresh(Venue)
+    suggested = suggestions.suggest(Venue, 'Mus')['names']
+    assert [data['name'] for data in suggested] == ['Musicians Hall', 'The Musical Hop']
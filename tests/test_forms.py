@@ -0,0 +1,17 @@
+from types import SimpleNamespace
+
+import pytest
+from wtforms.validators import ValidationError
+
+from forms import ArtistForm
+
+
+@pytest.mark.parametrize('phone', ['415-555-2671', '(415) 555-2671', '+1 415 555 2671', '+44 20 7946 0958'])
+def test_valid_phone(phone):
+    ArtistForm.validate_phone(None, SimpleNamespace(data=phone))
+
+
+@pytest.mark.parametrize('phone', ['123-456-7890', '555-0100', 'not a number', '+1 415 555 2671 0000'])
+def test_invalid_phone(phone):
+    with pytest.raises(ValidationError):
+        ArtistForm.validate_phone(None, SimpleNamespace(data=phone))
@@ -0,0 +1,94 @@
+from collections import namedtuple
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import app as fyyur
+from models import Artist, Venue
+
+Hit = namedtuple('Hit', 'id name num_upcoming_shows')
+
+
+def compile_query(query):
+    return query.statement.compile(dialect=postgresql.dialect())
+
+
+class Stub:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def all(self):
+        return self.value
+
+
+@pytest.fixture
+def context(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.mark.parametrize('model', [Venue, Artist])
+def test_long_term_ranked_by_similarity(context, model):
+    _, results = fyyur.search_queries(model, 'music')
+    statement = compile_query(results)
+    sql = ' '.join(str(statement).split())
+    table = model.__tablename__
+    assert 'ORDER BY greatest(similarity({0}.name, %(similarity_1)s), similarity({0}.city, %(similarity_2)s)) DESC, ' \
+           '{0}.name, {0}.id'.format(table) in sql
+    assert statement.params['param_1'] == context.config['SEARCH_RESULTS_LIMIT']
+
+
+@pytest.mark.parametrize('term', ['m', 'mu'])
+def test_short_term_listed_by_name(context, term):
+    _, results = fyyur.search_queries(Venue, term)
+    statement = compile_query(results)
+    sql = ' '.join(str(statement).split())
+    assert 'similarity' not in sql
+    assert 'ORDER BY venue.name, venue.id LIMIT' in sql
+    assert statement.params['name_1'] == '%' + term + '%'
+    assert statement.params['param_1'] == context.config['SEARCH_RESULTS_LIMIT']
+
+
+def test_count_stops_past_the_limit(context):
+    count, _ = fyyur.search_queries(Artist, 'band')
+    statement = compile_query(count)
+    sql = ' '.join(str(statement).split())
+    assert sql.startswith('SELECT count(*) AS count_1 FROM (SELECT artist.id AS id FROM artist WHERE')
+    assert statement.params['param_1'] == context.config['SEARCH_COUNT_LIMIT'] + 1
+
+
+def test_count_under_the_limit(context, monkeypatch):
+    hits = [Hit(1, 'The Musical Hop', 2), Hit(3, 'Park Square Live Music & Coffee', 0)]
+    monkeypatch.setattr(fyyur, 'search_queries', lambda model, term: (Stub(2), Stub(hits)))
+    result = fyyur.search_with_upcoming_counts(Venue, 'music')
+    assert result == {
+        "count": 2,
+        "capped": False,
+        "more": 0,
+        "data": [{"id": 1, "name": 'The Musical Hop', "num_upcoming_shows": 2},
+                 {"id": 3, "name": 'Park Square Live Music & Coffee', "num_upcoming_shows": 0}],
+    }
+
+
+def test_count_capped(context, monkeypatch):
+    count_limit, results_limit = context.config['SEARCH_COUNT_LIMIT'], context.config['SEARCH_RESULTS_LIMIT']
+    hits = [Hit(i, 'Venue {}'.format(i), 0) for i in range(results_limit)]
+    monkeypatch.setattr(fyyur, 'search_queries', lambda model, term: (Stub(count_limit + 1), Stub(hits)))
+    result = fyyur.search_with_upcoming_counts(Venue, 'a')
+    assert result['count'] == count_limit
+    assert result['capped']
+    assert result['more'] == count_limit - results_limit
+    assert len(result['data']) == results_limit
+
+
+def test_capped_count_shown_with_a_plus(app, monkeypatch):
+    count_limit = app.config['SEARCH_COUNT_LIMIT']
+    hits = [Hit(1, 'The Musical Hop', 2)]
+    monkeypatch.setattr(fyyur, 'search_queries', lambda model, term: (Stub(count_limit + 1), Stub(hits)))
+    response = app.test_client().post('/venues/search', data={'search_term': 'a'})
+    page = response.get_data(as_text=True)
+    assert ': {}+</h3>'.format(count_limit) in page
+    assert 'and {}+ more results'.format(count_limit - 1) in page
@@ -0,0 +1,19 @@
+from sqlalchemy.dialects import postgresql
+
+from models import db, Artist, Show, Venue, bump_versions
+
+
+def test_bump_versions(app, monkeypatch):
+    executed = []
+    with app.app_context():
+        monkeypatch.setattr(db.session, 'execute', executed.append)
+        bump_versions(Venue, Show, Artist, deleted=(Venue,))
+    statement, = executed
+    compiled = statement.compile(dialect=postgresql.dialect())
+    sql = ' '.join(str(compiled).split())
+    assert 'ON CONFLICT (name) DO UPDATE SET version = (table_version.version + %(version_1)s), ' \
+           'deletions = (table_version.deletions + excluded.deletions)' in sql
+    assert compiled.params['version_1'] == 1
+    # rows locked in name order, whatever the order of the arguments
+    rows = [(compiled.params['name_m{}'.format(i)], compiled.params['deletions_m{}'.format(i)]) for i in range(3)]
+    assert rows == [('artist', 0), ('show', 0), ('venue', 1)]